@@ -1,46 +1,85 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from datetime import datetime
+from flask import Flask, Response, g, render_template, request, redirect, url_for, flash, jsonify
+import atexit
+import base64
+import hashlib
+import json
+import time
+import threading
+from datetime import datetime, timezone
 from models import Database, StreamerModel, VODModel
-from worker import VODWorker
+from events import event_bus
+from cache import VersionedCache
+from telemetry import metrics, PROMETHEUS_CONTENT_TYPE
+from roster import FORMATS as ROSTER_FORMATS, detect_format, export_roster, import_roster, normalize_handle
 from config import Config
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 
-# Initialize database and models
+# Initialize database and models; the database is opened on first use
 db = Database()
 streamer_model = StreamerModel(db)
 vod_model = VODModel(db)
 
-# Initialize and start worker
-worker = VODWorker()
+# Formatted VOD listings shared by the dashboard and API
+vod_cache = VersionedCache(Config.VOD_CACHE_SIZE, Config.VOD_CACHE_TTL)
 
-def format_time_since(ended_at_str):
-    """Format time since VOD ended"""
-    if not ended_at_str:
+# The worker (and the Twitch client it brings in) is created on first use
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_worker():
+    """The worker sharing this process's database, created on first use"""
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                from worker import VODWorker
+                _worker = VODWorker(db=db)
+    return _worker
+
+VOD_STATUSES = ['new', 'in_progress', 'clipped']
+VOD_FIELDS = ['id', 'streamer_handle', 'title', 'url', 'duration', 'ended_at', 'status']
+
+REQUEST_DURATION = metrics.histogram(
+    'vodforge_http_request_duration_seconds',
+    'Flask route latency, up to the response being returned',
+    ['route', 'method', 'status']
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    return response
+
+def format_age(seconds):
+    """Format an age in seconds as time ago"""
+    if seconds is None:
         return 'Unknown'
     
-    try:
-        ended_at = datetime.strptime(ended_at_str, '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        try:
-            ended_at = datetime.strptime(ended_at_str.replace('T', ' ').replace('Z', ''), '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            return 'Unknown'
-    
-    now = datetime.utcnow()
-    delta = now - ended_at
-    
-    if delta.days > 0:
-        return f"{delta.days}d ago"
-    elif delta.seconds >= 3600:
-        hours = delta.seconds // 3600
-        return f"{hours}h ago"
-    elif delta.seconds >= 60:
-        minutes = delta.seconds // 60
-        return f"{minutes}m ago"
+    seconds = max(seconds, 0)
+    if seconds >= 86400:
+        return f"{seconds // 86400}d ago"
+    elif seconds >= 3600:
+        return f"{seconds // 3600}h ago"
+    elif seconds >= 60:
+        return f"{seconds // 60}m ago"
     else:
-        return f"{delta.seconds}s ago"
+        return f"{seconds}s ago"
+
+def format_time_since(ended_at_ts, now=None):
+    """Format time since VOD ended, given ended_at as epoch seconds"""
+    if ended_at_ts is None:
+        return 'Unknown'
+    now = now if now is not None else int(time.time())
+    return format_age(now - ended_at_ts)
 
 def format_duration(seconds):
     """Format duration in seconds to human readable format"""
@@ -58,43 +97,211 @@ def format_duration(seconds):
     else:
         return f"{secs}s"
 
-@app.route('/')
-def index():
-    """Dashboard - main page"""
-    streamers = streamer_model.get_all_streamers()
-    vods = vod_model.get_all_vods()
-    
-    # Format VOD data
-    formatted_vods = []
-    for vod in vods:
-        formatted_vods.append({
+def prepare_vods(vods):
+    """Format VOD rows for the API
+    
+    Returns (formatted, ended_at_ts) pairs; ended_at_ts positions the
+    listing's cursor.
+    """
+    return [
+        ({
             'id': vod['id'],
             'streamer_handle': vod['streamer_handle'],
             'title': vod['title'],
             'url': vod['url'],
             'duration': format_duration(vod['duration_seconds']),
             'ended_at': vod['ended_at'],
-            'time_since': format_time_since(vod['ended_at']),
             'status': vod['status']
-        })
+        }, vod['ended_at_ts'])
+        for vod in vods
+    ]
+
+def serve_vods(prepared, fields=None):
+    """Prepared VODs as served, optionally limited to some fields
+    
+    Nothing here depends on the current time, so a listing is the same bytes
+    for as long as its ETag is.
+    """
+    if not fields:
+        return [formatted for formatted, _ in prepared]
+    return [{field: formatted[field] for field in fields} for formatted, _ in prepared]
+
+def format_vods(vods, fields=None):
+    """Format VOD rows for display or the API, optionally limited to some fields"""
+    return serve_vods(prepare_vods(vods), fields)
+
+def cached_vods(key, version, loader):
+    """Prepared VODs for a listing, reloaded only when the VOD store changes or the TTL passes"""
+    return vod_cache.get(key, version, lambda: prepare_vods(loader()))
+
+def encode_cursor(ended_at_ts, vod_id):
+    """Encode a VOD's position in the listing as an opaque cursor"""
+    raw = json.dumps([ended_at_ts, vod_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (ended_at_ts, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ended_at_ts, vod_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(ended_at_ts), int(vod_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def parse_api_time(value):
+    """Convert an ISO 8601 query parameter to epoch seconds (naive times are UTC)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid time: {value}')
+    if not parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+def parse_listing_args():
+    """Parse the limit, fields and status parameters shared by the VOD listings
+    
+    Returns (limit, fields, status); raises ValueError with a message for the
+    client if any of them is invalid.
+    """
+    try:
+        limit = int(request.args.get('limit', Config.API_VODS_DEFAULT_LIMIT))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        raise ValueError('limit must be a positive integer')
+    limit = min(limit, Config.API_VODS_MAX_LIMIT)
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = set(fields) - set(VOD_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    
+    status = request.args.get('status')
+    if status and status not in VOD_STATUSES:
+        raise ValueError('Invalid status')
+    
+    return limit, fields, status
+
+def listing_validators():
+    """The VOD store's change version, plus the ETag and Last-Modified for this listing
+    
+    The ETag ties the version to the query string, so each listing is
+    validated separately. HTTP dates only have whole seconds, so while the
+    last change is still in the current second another could follow it with
+    the same date; Last-Modified is None until that second has passed.
+    """
+    version, updated_at = vod_model.get_version()
+    etag = f'{version}-{hashlib.sha1(request.query_string).hexdigest()[:12]}'
+    last_modified = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    if last_modified.timestamp() >= int(time.time()):
+        last_modified = None
+    return version, etag, last_modified
+
+def set_validators(response, etag, last_modified):
+    """Attach a listing's ETag and, once it is settled, Last-Modified to a response"""
+    # Without this, browsers may cache listings heuristically and serve a
+    # stale ?since= delta; no-cache makes every reuse revalidate the ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def conditional_response(etag, last_modified):
+    """A 304 Not Modified response if the client's copy of a listing is current, otherwise None"""
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # Last-Modified is only sent once its second has passed, so a client
+        # echoing it back can't be missing a change made in that second
+        not_modified = (
+            bool(request.if_modified_since)
+            and last_modified is not None
+            and last_modified <= request.if_modified_since
+        )
+    if not not_modified:
+        return None
+    return set_validators(app.response_class(status=304), etag, last_modified)
+
+def listing_page(key, version, load, limit, fields, etag, last_modified, next_page):
+    """Serve one page of a VOD listing, linking to the next page if there is one
     
-    return render_template('dashboard.html', streamers=streamers, vods=formatted_vods)
+    load(n) fetches up to n rows and is cached under key until the version
+    moves. next_page(page) returns the ('cursor' or 'offset', value) query
+    parameter for the following page.
+    """
+    # Fetch one extra row to learn whether another page exists
+    vods = cached_vods(key, version, lambda: load(limit + 1))
+    page = vods[:limit]
+    
+    response = set_validators(jsonify(serve_vods(page, fields)), etag, last_modified)
+    if len(vods) > limit:
+        name, value = next_page(page)
+        response.headers[f'X-Next-{name.title()}'] = str(value)
+        args = request.args.to_dict()
+        args[name] = value
+        response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+def dashboard_stats():
+    """Counts shown on the dashboard, from cheap aggregate queries"""
+    counts = vod_model.get_status_counts()
+    return {
+        'streamers': streamer_model.count_streamers(),
+        'vods': sum(counts.values()),
+        'statuses': {status: counts.get(status, 0) for status in VOD_STATUSES}
+    }
+
+@app.route('/')
+def index():
+    """Dashboard - main page
+    
+    Only the shell and counts are rendered here. The page loads VODs from
+    /api/vods a page at a time and keeps them current with ?since= deltas.
+    """
+    version, _ = vod_model.get_version()
+    return render_template(
+        'dashboard.html',
+        stats=dashboard_stats(),
+        version=version,
+        page_size=Config.API_VODS_DEFAULT_LIMIT,
+        statuses=VOD_STATUSES
+    )
+
+@app.route('/api/stats')
+def api_stats():
+    """Dashboard counts as JSON"""
+    return jsonify(dashboard_stats())
 
 @app.route('/streamers')
 def streamers():
     """Streamers management page"""
-    streamers = streamer_model.get_all_streamers()
-    return render_template('streamers.html', streamers=streamers)
+    now = int(time.time())
+    streamers = [
+        dict(streamer, last_vod=format_time_since(streamer['last_vod_ended_at_ts'], now) if streamer['vod_count'] else None)
+        for streamer in streamer_model.get_streamer_summaries()
+    ]
+    return render_template('streamers.html', streamers=streamers, statuses=VOD_STATUSES)
 
 @app.route('/streamers/add', methods=['POST'])
 def add_streamer():
     """Add a new streamer"""
-    handle = request.form.get('handle', '').strip()
+    value = request.form.get('handle', '').strip()
     
-    if not handle:
+    if not value:
         flash('Streamer handle is required', 'error')
         return redirect(url_for('streamers'))
     
+    handle = normalize_handle(value)
+    if handle is None:
+        flash(f'{value} is not a valid Twitch handle', 'error')
+        return redirect(url_for('streamers'))
+    
     streamer_id = streamer_model.add_streamer(handle)
     
     if streamer_id:
@@ -104,51 +311,319 @@ def add_streamer():
     
     return redirect(url_for('streamers'))
 
+def read_roster_upload():
+    """Roster text and format from an uploaded file, a form field or the raw request body"""
+    upload = request.files.get('file')
+    if upload and upload.filename:
+        text = upload.read().decode('utf-8-sig', errors='replace')
+        return text, request.values.get('format') or detect_format(text, upload.mimetype, upload.filename)
+    if 'handles' in request.form:
+        text = request.form['handles']
+        return text, request.values.get('format') or detect_format(text)
+    text = request.get_data(as_text=True)
+    return text, request.args.get('format') or detect_format(text, request.content_type)
+
+def resolve_in_background(streamers):
+    """Look up Twitch user IDs for new streamers without holding up the response"""
+    if streamers:
+        threading.Thread(target=get_worker().resolve_user_ids, args=(streamers,), daemon=True).start()
+
+@app.route('/streamers/import', methods=['POST'])
+def import_streamers():
+    """Add a pasted or uploaded list of streamers"""
+    try:
+        added, existing, invalid = import_roster(streamer_model, *read_roster_upload())
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('streamers'))
+    
+    resolve_in_background(added)
+    flash(f'Added {len(added)} streamer(s), {len(existing)} already present', 'success')
+    if invalid:
+        flash(f"Skipped {len(invalid)} invalid handle(s): {', '.join(invalid[:10])}", 'error')
+    return redirect(url_for('streamers'))
+
 @app.route('/streamers/delete/<int:streamer_id>', methods=['POST'])
 def delete_streamer(streamer_id):
-    """Delete a streamer"""
-    streamer_model.delete_streamer(streamer_id)
+    """Delete a streamer and its VODs"""
+    vod_ids = streamer_model.delete_streamer(streamer_id)
+    if vod_ids:
+        event_bus.publish('vods_deleted', {'ids': vod_ids})
     flash('Streamer deleted successfully', 'success')
     return redirect(url_for('streamers'))
 
+@app.route('/streamers/<int:streamer_id>/status', methods=['POST'])
+def update_streamer_vod_status(streamer_id):
+    """Set the status of all of a streamer's VODs, or those in current_status"""
+    status = request.form.get('status')
+    current_status = request.form.get('current_status') or None
+    if status not in VOD_STATUSES or current_status not in VOD_STATUSES + [None]:
+        flash('Invalid status', 'error')
+        return redirect(url_for('streamers'))
+    
+    streamer = streamer_model.get_streamer_by_id(streamer_id)
+    if not streamer:
+        flash('Streamer not found', 'error')
+        return redirect(url_for('streamers'))
+    
+    changed = vod_model.update_statuses(status, streamer_id=streamer_id, current_status=current_status)
+    if changed:
+        event_bus.publish('vods_status', {'ids': changed, 'status': status})
+    flash(f"Marked {len(changed)} VOD(s) from {streamer['handle']} as {status.replace('_', ' ')}", 'success')
+    return redirect(url_for('streamers'))
+
 @app.route('/vods/<int:vod_id>/status', methods=['POST'])
 def update_vod_status(vod_id):
-    """Update VOD status"""
+    """Update VOD status
+    
+    Clients that accept JSON (the dashboard's script) get a JSON result;
+    plain form posts are redirected back to the dashboard.
+    """
     status = request.form.get('status')
+    wants_json = request.accept_mimetypes.best == 'application/json'
     
-    if status in ['new', 'in_progress', 'clipped']:
-        vod_model.update_status(vod_id, status)
-        flash('VOD status updated', 'success')
-    else:
+    if status not in VOD_STATUSES:
+        if wants_json:
+            return jsonify({'error': 'Invalid status'}), 400
         flash('Invalid status', 'error')
+        return redirect(url_for('index'))
+    
+    if not vod_model.update_status(vod_id, status):
+        if wants_json:
+            return jsonify({'error': 'VOD not found'}), 404
+        flash('VOD not found', 'error')
+        return redirect(url_for('index'))
     
+    event_bus.publish('vod_status', {'id': vod_id, 'status': status})
+    if wants_json:
+        return jsonify({'id': vod_id, 'status': status})
+    flash('VOD status updated', 'success')
     return redirect(url_for('index'))
 
+@app.route('/api/vods/status', methods=['POST'])
+def api_update_vod_statuses():
+    """Set the status of many VODs in one transaction
+    
+    The JSON body names the new status and either a list of VOD ids or a
+    streamer (by id or handle), optionally narrowed to VODs currently in
+    current_status:
+    
+        {"status": "in_progress", "ids": [101, 102, 103]}
+        {"status": "clipped", "streamer": "shroud", "current_status": "in_progress"}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    status = body.get('status')
+    current_status = body.get('current_status')
+    if status not in VOD_STATUSES or current_status not in VOD_STATUSES + [None]:
+        return jsonify({'error': f"status must be one of: {', '.join(VOD_STATUSES)}"}), 400
+    
+    vod_ids = body.get('ids')
+    streamer_id = body.get('streamer_id')
+    handle = body.get('streamer')
+    if vod_ids is not None:
+        if not isinstance(vod_ids, list) or not all(isinstance(vod_id, int) and not isinstance(vod_id, bool) for vod_id in vod_ids):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+    elif streamer_id is None and handle is None:
+        return jsonify({'error': 'Give ids, streamer_id or streamer'}), 400
+    
+    if streamer_id is not None or handle is not None:
+        if streamer_id is not None:
+            streamer = streamer_model.get_streamer_by_id(streamer_id) if isinstance(streamer_id, int) else None
+        else:
+            streamer = streamer_model.get_streamer_by_handle(str(handle))
+        if not streamer:
+            return jsonify({'error': 'Streamer not found'}), 404
+        streamer_id = streamer['id']
+    
+    changed = vod_model.update_statuses(status, vod_ids=vod_ids, streamer_id=streamer_id, current_status=current_status)
+    if changed:
+        event_bus.publish('vods_status', {'ids': changed, 'status': status})
+    return jsonify({'status': status, 'updated': changed})
+
 @app.route('/api/vods')
 def api_vods():
-    """API endpoint to get VODs"""
-    vods = vod_model.get_all_vods()
+    """API endpoint to get VODs
     
-    formatted_vods = []
-    for vod in vods:
-        formatted_vods.append({
-            'id': vod['id'],
-            'streamer_handle': vod['streamer_handle'],
-            'title': vod['title'],
-            'url': vod['url'],
-            'duration': format_duration(vod['duration_seconds']),
-            'ended_at': vod['ended_at'],
-            'time_since': format_time_since(vod['ended_at']),
-            'status': vod['status']
-        })
+    Returns a page of VODs, newest first, or with ?since= the changes after
+    a version. The README lists the query parameters.
+    """
+    version, etag, last_modified = listing_validators()
+    response = conditional_response(etag, last_modified)
+    if response:
+        return response
+    
+    try:
+        limit, fields, status = parse_listing_args()
+        before = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        ended_after = parse_api_time(request.args.get('ended_after'))
+        ended_before = parse_api_time(request.args.get('ended_before'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(formatted_vods)
+    if request.args.get('since') is not None:
+        try:
+            since = int(request.args['since'])
+        except ValueError:
+            return jsonify({'error': 'since must be an integer version'}), 400
+        
+        changes = vod_model.get_changes_since(since, limit)
+        changes['vods'] = format_vods(changes['vods'], fields)
+        return set_validators(jsonify(changes), etag, last_modified)
+    
+    streamer_handle = request.args.get('streamer')
+    return listing_page(
+        ('page', limit, before, streamer_handle, status, ended_after, ended_before),
+        version,
+        lambda rows: vod_model.get_vods_page(
+            rows,
+            before=before,
+            streamer_handle=streamer_handle,
+            status=status,
+            ended_after=ended_after,
+            ended_before=ended_before
+        ),
+        limit, fields, etag, last_modified,
+        lambda page: ('cursor', encode_cursor(page[-1][1], page[-1][0]['id']))
+    )
+
+@app.route('/api/vods/search')
+def api_vods_search():
+    """Full-text search over VOD titles and streamer handles
+    
+    Returns a page of matching VODs, best match first. The README lists the
+    query parameters.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    
+    version, etag, last_modified = listing_validators()
+    response = conditional_response(etag, last_modified)
+    if response:
+        return response
+    
+    try:
+        limit, fields, status = parse_listing_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        offset = int(request.args.get('offset', 0))
+        if offset < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'offset must be a non-negative integer'}), 400
+    
+    streamer_handle = request.args.get('streamer')
+    return listing_page(
+        ('search', query, limit, offset, streamer_handle, status),
+        version,
+        lambda rows: vod_model.search_vods(
+            query,
+            rows,
+            offset=offset,
+            streamer_handle=streamer_handle,
+            status=status
+        ),
+        limit, fields, etag, last_modified,
+        lambda page: ('offset', offset + limit)
+    )
+
+@app.route('/api/vods/stream')
+def api_vods_stream():
+    """Server-Sent Events feed of VOD changes
+    
+    Emits vod_added, vod_status, vods_status (bulk) and vods_deleted events. Reconnecting clients
+    send Last-Event-ID (or ?last_event_id=) to receive the events they missed;
+    if those are no longer buffered a reset event tells them to refetch.
+    """
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else event_bus.last_id()
+    except ValueError:
+        last_id = event_bus.last_id()
+    
+    def stream(last_id):
+        while True:
+            events, missed = event_bus.wait(last_id, timeout=Config.SSE_KEEPALIVE)
+            if missed:
+                # Too far behind to replay; the client should refetch instead
+                last_id = event_bus.last_id()
+                yield f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+                continue
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return Response(stream(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/streamers/import', methods=['POST'])
+def api_import_streamers():
+    """Add streamers in bulk from CSV, JSON or one handle per line
+    
+    The roster is the raw request body or a multipart file upload. Handles
+    are normalized and deduplicated, and added in one transaction. With
+    ?resolve=1 their Twitch user IDs are looked up right away instead of on
+    the worker's next poll.
+    """
+    text, roster_format = read_roster_upload()
+    if roster_format not in ROSTER_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(ROSTER_FORMATS)}"}), 400
+    try:
+        added, existing, invalid = import_roster(streamer_model, text, roster_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('resolve', '').lower() in ('1', 'true', 'yes'):
+        resolve_in_background(added)
+    
+    return jsonify({
+        'added': [streamer['handle'] for streamer in added],
+        'existing': existing,
+        'invalid': invalid
+    }), 201 if added else 200
+
+@app.route('/api/streamers/export')
+def api_export_streamers():
+    """Stream the streamer roster as CSV, JSON or one handle per line"""
+    roster_format = request.args.get('format', 'csv')
+    if roster_format not in ROSTER_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(ROSTER_FORMATS)}"}), 400
+    
+    mimetypes = {'csv': 'text/csv', 'json': 'application/json', 'txt': 'text/plain'}
+    return Response(
+        export_roster(streamer_model.iter_streamers(), roster_format),
+        mimetype=mimetypes[roster_format],
+        headers={'Content-Disposition': f'attachment; filename=streamers.{roster_format}'}
+    )
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for the web app and any worker running in this process"""
+    return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 def start_app():
-    """Start the Flask app and worker"""
-    worker.start()
+    """Start the Flask app and, unless workers run as separate processes, the worker"""
+    if Config.RUN_WORKER_IN_APP:
+        get_worker().start()
+    atexit.register(shutdown_app)
     return app
 
+def shutdown_app():
+    """Stop the worker if it is running and close the pooled database connections"""
+    if _worker is not None and _worker.running:
+        _worker.stop()
+    db.close_all()
+
 if __name__ == '__main__':
     app = start_app()
     app.run(debug=Config.DEBUG, host='127.0.0.1', port=5000)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark against the local Helix mock
+
+Each scale runs in a fresh process with its own temporary database and
+mock_helix server. A cold sweep polls every streamer from scratch, a warm
+sweep repeats it with high-water marks in place, and then / and /api/vods
+are timed in-process through the Flask test client.
+
+    python bench.py                              # 10, 1000 and 10000 streamers
+    python bench.py --streamers 1000 --latency 0.05 --error-rate 0.01
+    python bench.py --json > baseline.json       # keep for comparing later runs
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+DEFAULT_SCALES = [10, 1000, 10000]
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def timed_sweep(worker, helix, count_vods):
+    """Poll every streamer once; returns duration, requests and VODs written"""
+    requests_before = helix.request_count()
+    vods_before = count_vods()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        worker.poll_streamers()
+    duration = time.perf_counter() - start
+    requests = helix.request_count() - requests_before
+    writes = count_vods() - vods_before
+    return {
+        'duration': duration,
+        'requests': requests,
+        'requests_per_sec': requests / duration if duration else 0,
+        'vods_written': writes,
+        'writes_per_sec': writes / duration if duration else 0
+    }
+
+def timed_route(client, path, requests):
+    """Request a route repeatedly; returns p50/p95/p99 latency in milliseconds"""
+    client.get(path)  # warm the listing cache and templates
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {path} returned {response.status_code}")
+    return {f'p{pct}': percentile(samples, pct) for pct in (50, 95, 99)}
+
+def run_scale(args):
+    """Benchmark one scale in this process and return the results"""
+    from mock_helix import MockHelix, serve
+    from config import Config
+    
+    workdir = tempfile.mkdtemp(prefix='vodforge-bench-')
+    helix = MockHelix(
+        channels=args.single,
+        vods_per_channel=args.vods,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate
+    )
+    server = serve(helix)
+    
+    # Config must point at the mock before the app and worker are imported
+    Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    Config.TWITCH_AUTH_URL = f'http://127.0.0.1:{server.server_port}/oauth2'
+    Config.TWITCH_API_URL = f'http://127.0.0.1:{server.server_port}/helix'
+    Config.TWITCH_CLIENT_ID = 'bench'
+    Config.TWITCH_CLIENT_SECRET = 'bench'
+    Config.TWITCH_RATE_LIMIT = args.rate_limit or 10 ** 9
+    Config.RUN_WORKER_IN_APP = False
+    if args.concurrency:
+        Config.POLL_CONCURRENCY = args.concurrency
+    
+    from models import Database, StreamerModel
+    from worker import VODWorker
+    
+    db = Database()
+    streamer_model = StreamerModel(db)
+    for index in range(args.single):
+        streamer_model.add_streamer(helix.login(index))
+    
+    def count_vods():
+        conn = db.get_connection()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM vods').fetchone()[0]
+        finally:
+            db.release(conn)
+    
+    worker = VODWorker(worker_id='bench')
+    cold = timed_sweep(worker, helix, count_vods)
+    warm = timed_sweep(worker, helix, count_vods)
+    worker.twitch_client.close()
+    
+    import app as web
+    client = web.app.test_client()
+    routes = {path: timed_route(client, path, args.requests) for path in ('/', '/api/vods')}
+    
+    server.shutdown()
+    return {
+        'streamers': args.single,
+        'vods': count_vods(),
+        'poll_interval': Config.POLL_INTERVAL,
+        'cold_sweep': cold,
+        'warm_sweep': warm,
+        'routes': routes,
+        'twitch_responses': {f'{endpoint} {status}': count for (endpoint, status), count in sorted(helix.counts.items())}
+    }
+
+def print_report(results):
+    print(f"{'streamers':>9} {'vods':>7} | {'sweep':>13} {'req/s':>8} {'writes/s':>9} | "
+          f"{'warm sweep':>10} {'req/s':>8} | {'/ p50/p95/p99 ms':>22} | {'/api/vods p50/p95/p99 ms':>24}")
+    for result in results:
+        cold, warm = result['cold_sweep'], result['warm_sweep']
+        latency = {
+            path: '/'.join(f"{timing[f'p{pct}']:.1f}" for pct in (50, 95, 99))
+            for path, timing in result['routes'].items()
+        }
+        over = ' !' if cold['duration'] > result['poll_interval'] else '  '
+        print(f"{result['streamers']:>9} {result['vods']:>7} | {cold['duration']:>10.2f} s{over}"
+              f"{cold['requests_per_sec']:>8.0f} {cold['writes_per_sec']:>9.0f} | "
+              f"{warm['duration']:>8.2f} s {warm['requests_per_sec']:>8.0f} | "
+              f"{latency['/']:>22} | {latency['/api/vods']:>24}")
+    if any(result['cold_sweep']['duration'] > result['poll_interval'] for result in results):
+        print("! sweep took longer than POLL_INTERVAL")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark polling and the web app against a mock Helix API')
+    parser.add_argument('--streamers', type=int, nargs='+', default=DEFAULT_SCALES, help='Scales to run')
+    parser.add_argument('--vods', type=int, default=5, help='VODs per synthetic channel')
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per route')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of mock latency per Helix call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random mock latency, in seconds')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Mock Helix requests per minute (0 disables)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock Helix calls that return 503')
+    parser.add_argument('--concurrency', type=int, default=0, help='Override POLL_CONCURRENCY')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)  # internal: run one scale in this process
+    args = parser.parse_args()
+    
+    if args.single:
+        print(json.dumps(run_scale(args)))
+        return
+    
+    results = []
+    for streamers in args.streamers:
+        # A fresh interpreter per scale, since the app builds its database at import time
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(streamers)]
+        for option in ('vods', 'requests', 'latency', 'jitter', 'rate_limit', 'error_rate', 'concurrency'):
+            command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        if not args.json:
+            print(f"  {streamers} streamer(s) done", file=sys.stderr)
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+if __name__ == '__main__':
+    main()
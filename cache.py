@@ -0,0 +1,55 @@
+import time
+import threading
+from collections import OrderedDict
+
+class VersionedCache:
+    """Thread-safe LRU cache for values derived from the VOD store
+    
+    An entry is reused only while it is younger than the TTL and was built
+    for the current change version, so any write to the VOD store, from any
+    thread or process, invalidates it. Concurrent misses for the same key
+    share a single load.
+    """
+    
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (version, expires_at, value)
+        self._loading = {}  # key -> lock held while the value is loaded
+        self._lock = threading.Lock()
+    
+    def _lookup(self, key, version):
+        """Return (True, value) for a fresh entry; call with the lock held"""
+        entry = self._entries.get(key)
+        if entry and entry[0] == version and entry[1] > time.monotonic():
+            self._entries.move_to_end(key)
+            return True, entry[2]
+        return False, None
+    
+    def get(self, key, version, loader):
+        """Get the value for key at version, calling loader() on a miss"""
+        with self._lock:
+            found, value = self._lookup(key, version)
+            if found:
+                return value
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        
+        with load_lock:
+            # Another request may have loaded it while we waited
+            with self._lock:
+                found, value = self._lookup(key, version)
+                if found:
+                    return value
+            
+            try:
+                value = loader()
+                with self._lock:
+                    self._entries[key] = (version, time.monotonic() + self.ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            finally:
+                # Drop the load lock even if loading failed, so keys don't pile up
+                with self._lock:
+                    self._loading.pop(key, None)
+            return value
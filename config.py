@@ -9,14 +9,56 @@ class Config:
     # Flask
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # 'json' for one structured record per line
+    
+    # API
+    API_VODS_DEFAULT_LIMIT = int(os.getenv('API_VODS_DEFAULT_LIMIT', '100'))  # VODs per /api/vods page
+    API_VODS_MAX_LIMIT = int(os.getenv('API_VODS_MAX_LIMIT', '1000'))
+    VOD_CACHE_SIZE = int(os.getenv('VOD_CACHE_SIZE', '256'))  # cached VOD listings
+    VOD_CACHE_TTL = int(os.getenv('VOD_CACHE_TTL', '30'))  # seconds a cached listing may be reused
+    EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', '1000'))  # events kept for Last-Event-ID resume
+    SSE_KEEPALIVE = int(os.getenv('SSE_KEEPALIVE', '15'))  # seconds between keep-alive comments
     
     # Database
     DATABASE_PATH = 'vodforge.db'
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))  # idle connections kept open for reuse
+    DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', '5000'))  # milliseconds to wait on a locked database
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))  # page cache per connection
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # bytes of the database memory-mapped
     
     # Twitch API
     TWITCH_CLIENT_ID = os.getenv('TWITCH_CLIENT_ID', '')
     TWITCH_CLIENT_SECRET = os.getenv('TWITCH_CLIENT_SECRET', '')
+    TWITCH_AUTH_URL = os.getenv('TWITCH_AUTH_URL', 'https://id.twitch.tv/oauth2').rstrip('/')
+    TWITCH_API_URL = os.getenv('TWITCH_API_URL', 'https://api.twitch.tv/helix').rstrip('/')  # point at mock_helix.py to test offline
+    TWITCH_REQUEST_TIMEOUT = int(os.getenv('TWITCH_REQUEST_TIMEOUT', '10'))  # seconds per HTTP call
+    TWITCH_POOL_SIZE = int(os.getenv('TWITCH_POOL_SIZE', '16'))  # pooled keep-alive connections
+    TWITCH_MAX_RETRIES = int(os.getenv('TWITCH_MAX_RETRIES', '3'))  # retries on 5xx/connection errors
+    TWITCH_RETRY_BACKOFF = float(os.getenv('TWITCH_RETRY_BACKOFF', '0.5'))  # exponential backoff factor (seconds)
+    TWITCH_RATE_LIMIT = int(os.getenv('TWITCH_RATE_LIMIT', '800'))  # Helix requests per minute until headers say otherwise
+    TWITCH_RATE_LIMIT_RETRIES = int(os.getenv('TWITCH_RATE_LIMIT_RETRIES', '5'))  # times a 429 is re-queued
     
     # Worker
-    POLL_INTERVAL = 120  # seconds
+    POLL_INTERVAL = 120  # seconds; sweeps slower than this are reported as overruns
+    POLL_MIN_INTERVAL = int(os.getenv('POLL_MIN_INTERVAL', '60'))  # seconds between polls of an active channel
+    POLL_MAX_INTERVAL = int(os.getenv('POLL_MAX_INTERVAL', '1800'))  # seconds between polls of a dormant channel
+    POLL_ACTIVE_WINDOW = int(os.getenv('POLL_ACTIVE_WINDOW', str(6 * 3600)))  # a VOD ending this recently keeps polling at the minimum
+    POLL_JITTER = float(os.getenv('POLL_JITTER', '0.1'))  # +/- fraction applied to each interval
+    LIVE_GATING = os.getenv('LIVE_GATING', 'True').lower() == 'true'  # only fetch videos when live status changes
+    LIVE_CHECK_INTERVAL = int(os.getenv('LIVE_CHECK_INTERVAL', '60'))  # seconds between batched live-status checks
+    LIVE_RECHECK_INTERVAL = int(os.getenv('LIVE_RECHECK_INTERVAL', '3600'))  # safety re-poll for unchanged streamers
+    RUN_WORKER_IN_APP = os.getenv('RUN_WORKER_IN_APP', 'True').lower() == 'true'  # False when running python -m worker
+    LEASE_TTL = int(os.getenv('LEASE_TTL', '120'))  # seconds before a silent worker's streamers are reassigned
+    LEASE_RENEW_INTERVAL = int(os.getenv('LEASE_RENEW_INTERVAL', '20'))  # seconds between heartbeats/rebalancing
+    POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', '16'))  # streamers polled in parallel
+    POLL_STREAMER_TIMEOUT = int(os.getenv('POLL_STREAMER_TIMEOUT', '30'))  # seconds per streamer
+    VIDEO_PAGE_SIZE = int(os.getenv('VIDEO_PAGE_SIZE', '20'))  # videos per Helix page (max 100)
+    VIDEO_MAX_PAGES = int(os.getenv('VIDEO_MAX_PAGES', '10'))  # pages followed per streamer per poll
+    UNKNOWN_USER_RETRY = int(os.getenv('UNKNOWN_USER_RETRY', '3600'))  # seconds before re-checking a missing handle
+    USER_LOOKUP_RETRY = int(os.getenv('USER_LOOKUP_RETRY', '300'))  # seconds before retrying handles whose lookup failed
     VOD_RETENTION_DAYS = 7
+    WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '0'))  # /metrics port for python -m worker; 0 disables
+    CLEANUP_INTERVAL = int(os.getenv('CLEANUP_INTERVAL', '3600'))  # seconds between retention cleanups
+    CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', '1000'))  # VODs deleted per transaction
+    CLEANUP_BATCH_PAUSE = float(os.getenv('CLEANUP_BATCH_PAUSE', '0.1'))  # seconds between batches
+    VOD_ARCHIVE_PATH = os.getenv('VOD_ARCHIVE_PATH', '')  # gzip JSON-lines file for expired VODs; empty disables
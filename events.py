@@ -0,0 +1,45 @@
+import time
+import threading
+from collections import deque
+from config import Config
+
+class EventBus:
+    """In-process publish/subscribe bus for VOD change events
+    
+    Events are kept in a bounded buffer so subscribers that reconnect with
+    the last event ID they saw can catch up on what they missed.
+    """
+    
+    def __init__(self, buffer_size=None):
+        self._events = deque(maxlen=buffer_size or Config.EVENT_BUFFER_SIZE)
+        self._cond = threading.Condition()
+        # Seed IDs from the clock so they keep increasing across restarts
+        self._last_id = int(time.time() * 1000)
+        self._first_id = self._last_id + 1
+    
+    def publish(self, event_type, data):
+        """Publish an event to every subscriber"""
+        with self._cond:
+            self._last_id += 1
+            self._events.append({'id': self._last_id, 'type': event_type, 'data': data})
+            self._cond.notify_all()
+    
+    def last_id(self):
+        """ID of the most recent event"""
+        with self._cond:
+            return self._last_id
+    
+    def wait(self, after_id, timeout):
+        """Wait up to timeout seconds for events newer than after_id
+        
+        Returns (events, missed) where missed is True if events after after_id
+        have already fallen out of the buffer.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > after_id, timeout=timeout)
+            oldest = self._events[0]['id'] if self._events else self._first_id
+            missed = after_id + 1 < oldest
+            return [event for event in self._events if event['id'] > after_id], missed
+
+# Shared by the web app and the worker running in the same process
+event_bus = EventBus()
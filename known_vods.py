@@ -0,0 +1,107 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+class KnownVODIndex:
+    """Compact in-memory set of the Twitch VOD IDs already stored
+    
+    Twitch VOD IDs are numeric, so most of the index is a sorted array of
+    64-bit integers (8 bytes per VOD) searched by bisection. Recent additions
+    and removals are kept in small sets and merged into the array once they
+    grow past a fraction of it. IDs that aren't numeric fall back to a set.
+    
+    A hit means the VOD is stored, or was until retention removed it; a miss
+    only means this process hasn't seen it, so misses still go to the database.
+    """
+    
+    MERGE_FRACTION = 0.1  # merge pending changes once they reach this share of the array
+    MERGE_MINIMUM = 1024
+    
+    def __init__(self):
+        self.loaded = False
+        self._ids = array('q')  # sorted
+        self._added = set()
+        self._removed = set()
+        self._other = set()  # non-numeric IDs
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(twitch_vod_id):
+        try:
+            return int(twitch_vod_id)
+        except (TypeError, ValueError):
+            return None
+    
+    def load(self, twitch_vod_ids):
+        """Replace the index with the given IDs"""
+        numeric = []
+        other = set()
+        for twitch_vod_id in twitch_vod_ids:
+            key = self._key(twitch_vod_id)
+            if key is None:
+                other.add(twitch_vod_id)
+            else:
+                numeric.append(key)
+        ids = array('q', sorted(set(numeric)))
+        
+        with self._lock:
+            self._ids = ids
+            self._added = set()
+            self._removed = set()
+            self._other = other
+            self.loaded = True
+    
+    def _in_array(self, key):
+        i = bisect_left(self._ids, key)
+        return i < len(self._ids) and self._ids[i] == key
+    
+    def __contains__(self, twitch_vod_id):
+        key = self._key(twitch_vod_id)
+        with self._lock:
+            if key is None:
+                return twitch_vod_id in self._other
+            if key in self._added:
+                return True
+            if key in self._removed:
+                return False
+            return self._in_array(key)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._ids) + len(self._added) - len(self._removed) + len(self._other)
+    
+    def add(self, twitch_vod_ids):
+        """Record VODs as stored"""
+        with self._lock:
+            for twitch_vod_id in twitch_vod_ids:
+                key = self._key(twitch_vod_id)
+                if key is None:
+                    self._other.add(twitch_vod_id)
+                    continue
+                self._removed.discard(key)
+                if not self._in_array(key):
+                    self._added.add(key)
+            self._maybe_merge()
+    
+    def discard(self, twitch_vod_ids):
+        """Record VODs as deleted"""
+        with self._lock:
+            for twitch_vod_id in twitch_vod_ids:
+                key = self._key(twitch_vod_id)
+                if key is None:
+                    self._other.discard(twitch_vod_id)
+                    continue
+                self._added.discard(key)
+                if self._in_array(key):
+                    self._removed.add(key)
+            self._maybe_merge()
+    
+    def _maybe_merge(self):
+        """Fold pending additions and removals into the sorted array; call with the lock held"""
+        pending = len(self._added) + len(self._removed)
+        if pending < max(self.MERGE_MINIMUM, len(self._ids) * self.MERGE_FRACTION):
+            return
+        merged = (set(self._ids) - self._removed) | self._added
+        self._ids = array('q', sorted(merged))
+        self._added = set()
+        self._removed = set()
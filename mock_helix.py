@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Twitch Helix API
+
+Serves /oauth2/token, /helix/users, /helix/videos and /helix/streams for a
+set of synthetic channels, so the worker can be run and benchmarked without
+Twitch credentials. Start it and point VODForge at it:
+
+    python mock_helix.py --channels 1000 --vods 20
+    TWITCH_AUTH_URL=http://127.0.0.1:5001/oauth2 TWITCH_API_URL=http://127.0.0.1:5001/helix python run.py
+
+Channels are named channel0, channel1, ... and every value is derived from
+the channel number, so runs with the same options see the same data.
+"""
+
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+class MockHelix:
+    """Synthetic channels plus the knobs that make the API misbehave"""
+    
+    USER_ID_BASE = 100000
+    MAX_PAGE_SIZE = 100
+    
+    def __init__(self, channels=100, vods_per_channel=20, vod_interval=86400, live_fraction=0.1,
+                 latency=0.0, jitter=0.0, rate_limit=0, error_rate=0.0, token_ttl=3600, seed=0):
+        self.channels = channels
+        self.vods_per_channel = vods_per_channel
+        self.vod_interval = vod_interval  # seconds between a channel's streams
+        self.live_fraction = live_fraction
+        self.latency = latency  # seconds added to every response
+        self.jitter = jitter  # up to this many extra seconds, at random
+        self.rate_limit = rate_limit  # requests per minute; 0 disables
+        self.error_rate = error_rate  # fraction of Helix requests answered with a 503
+        self.token_ttl = token_ttl
+        self.seed = seed
+        self.anchor = datetime.utcnow().replace(microsecond=0)  # newest VODs end about now
+        
+        self.counts = Counter()  # (endpoint, status) -> responses sent
+        self._tokens = float(rate_limit)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+    
+    def login(self, index):
+        return f'channel{index}'
+    
+    def user_id(self, index):
+        return str(self.USER_ID_BASE + index)
+    
+    def index_for_login(self, login):
+        """Channel number for a login, or None if no such channel"""
+        login = login.lower()
+        if not login.startswith('channel') or not login[7:].isdigit():
+            return None
+        index = int(login[7:])
+        return index if index < self.channels else None
+    
+    def index_for_user_id(self, user_id):
+        """Channel number for a user ID, or None if no such channel"""
+        if not user_id.isdigit():
+            return None
+        index = int(user_id) - self.USER_ID_BASE
+        return index if 0 <= index < self.channels else None
+    
+    def is_live(self, index):
+        return random.Random(self.seed * 1000003 + index).random() < self.live_fraction
+    
+    def user(self, index):
+        return {
+            'id': self.user_id(index),
+            'login': self.login(index),
+            'display_name': self.login(index),
+            'type': '',
+            'broadcaster_type': '',
+            'created_at': '2016-01-01T00:00:00Z'
+        }
+    
+    def video(self, index, number):
+        """The channel's number-th newest VOD"""
+        duration = 3600 + (index * 7919 + number * 104729) % 14400
+        # Offset each channel so they don't all stream at the same moment
+        ended_at = self.anchor - timedelta(seconds=number * self.vod_interval + index % self.vod_interval)
+        created_at = ended_at - timedelta(seconds=duration)
+        video_id = str((self.USER_ID_BASE + index) * 100000 + number)
+        hours, rest = divmod(duration, 3600)
+        return {
+            'id': video_id,
+            'user_id': self.user_id(index),
+            'user_login': self.login(index),
+            'title': f'{self.login(index)} stream #{self.vods_per_channel - number}',
+            'url': f'https://www.twitch.tv/videos/{video_id}',
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'duration': f'{hours}h{rest // 60}m{rest % 60}s',
+            'type': 'archive'
+        }
+    
+    def stream(self, index):
+        return {
+            'id': str(self.USER_ID_BASE + index),
+            'user_id': self.user_id(index),
+            'user_login': self.login(index),
+            'type': 'live',
+            'title': f'{self.login(index)} is live',
+            'started_at': self.anchor.strftime('%Y-%m-%dT%H:%M:%SZ')
+        }
+    
+    def _take_token(self):
+        """Consume one request from the per-minute budget; returns (allowed, remaining, reset_at)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit / 60)
+            self._refilled_at = now
+            allowed = self._tokens >= 1
+            if allowed:
+                self._tokens -= 1
+            reset_at = int(time.time() + (self.rate_limit - self._tokens) * 60 / self.rate_limit) + 1
+            return allowed, int(self._tokens), reset_at
+    
+    def _delay(self):
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+    
+    def _count(self, endpoint, status):
+        with self._lock:
+            self.counts[(endpoint, status)] += 1
+    
+    def request_count(self):
+        """Total responses sent"""
+        with self._lock:
+            return sum(self.counts.values())
+    
+    def create_app(self):
+        """Flask app serving the mock endpoints"""
+        app = Flask(__name__)
+        
+        @app.route('/oauth2/token', methods=['POST'])
+        def token():
+            self._delay()
+            self._count('token', 200)
+            return jsonify({
+                'access_token': f'mock-{self._random.getrandbits(64):016x}',
+                'expires_in': self.token_ttl,
+                'token_type': 'bearer'
+            })
+        
+        def helix(endpoint, handler):
+            self._delay()
+            
+            if not request.headers.get('Authorization', '').startswith('Bearer ') or not request.headers.get('Client-ID'):
+                self._count(endpoint, 401)
+                return jsonify({'error': 'Unauthorized', 'status': 401, 'message': 'OAuth token is missing'}), 401
+            
+            headers = {}
+            if self.rate_limit:
+                allowed, remaining, reset_at = self._take_token()
+                headers = {
+                    'Ratelimit-Limit': str(self.rate_limit),
+                    'Ratelimit-Remaining': str(remaining),
+                    'Ratelimit-Reset': str(reset_at)
+                }
+                if not allowed:
+                    self._count(endpoint, 429)
+                    return jsonify({'error': 'Too Many Requests', 'status': 429, 'message': ''}), 429, headers
+            
+            if self._should_fail():
+                self._count(endpoint, 503)
+                return jsonify({'error': 'Service Unavailable', 'status': 503, 'message': 'injected error'}), 503, headers
+            
+            self._count(endpoint, 200)
+            return jsonify(handler()), 200, headers
+        
+        def first_param(default=20):
+            try:
+                return max(1, min(self.MAX_PAGE_SIZE, int(request.args.get('first', default))))
+            except ValueError:
+                return default
+        
+        @app.route('/helix/users')
+        def users():
+            def handler():
+                indexes = [self.index_for_login(login) for login in request.args.getlist('login')]
+                indexes += [self.index_for_user_id(user_id) for user_id in request.args.getlist('id')]
+                return {'data': [self.user(index) for index in indexes if index is not None]}
+            return helix('users', handler)
+        
+        @app.route('/helix/videos')
+        def videos():
+            def handler():
+                index = self.index_for_user_id(request.args.get('user_id', ''))
+                if index is None or request.args.get('type', 'all') not in ('all', 'archive'):
+                    return {'data': [], 'pagination': {}}
+                first = first_param()
+                offset = int(request.args.get('after') or 0)
+                end = min(offset + first, self.vods_per_channel)
+                pagination = {'cursor': str(end)} if end < self.vods_per_channel else {}
+                return {
+                    'data': [self.video(index, number) for number in range(offset, end)],
+                    'pagination': pagination
+                }
+            return helix('videos', handler)
+        
+        @app.route('/helix/streams')
+        def streams():
+            def handler():
+                indexes = (self.index_for_user_id(user_id) for user_id in request.args.getlist('user_id'))
+                live = [self.stream(index) for index in indexes if index is not None and self.is_live(index)]
+                return {'data': live[:first_param()], 'pagination': {}}
+            return helix('streams', handler)
+        
+        return app
+
+def serve(helix, host='127.0.0.1', port=0):
+    """Serve a MockHelix on a background thread and return the server
+    
+    port=0 picks a free port; read it back from server.server_port. Call
+    server.shutdown() when done.
+    """
+    server = make_server(host, port, helix.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock of the Twitch Helix API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--channels', type=int, default=100, help='Synthetic channels (channel0 ... channelN-1)')
+    parser.add_argument('--vods', type=int, default=20, help='VODs per channel')
+    parser.add_argument('--vod-interval', type=int, default=86400, help='Seconds between a channel\'s VODs')
+    parser.add_argument('--live-fraction', type=float, default=0.1, help='Fraction of channels reported live')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per response')
+    parser.add_argument('--rate-limit', type=int, default=800, help='Helix requests per minute (0 disables)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of Helix requests that return 503')
+    parser.add_argument('--token-ttl', type=int, default=3600, help='Seconds until issued tokens expire')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    helix = MockHelix(
+        channels=args.channels,
+        vods_per_channel=args.vods,
+        vod_interval=args.vod_interval,
+        live_fraction=args.live_fraction,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        token_ttl=args.token_ttl,
+        seed=args.seed
+    )
+    print(f"Mock Helix serving {args.channels} channel(s) on http://{args.host}:{args.port}")
+    print(f"  TWITCH_AUTH_URL=http://{args.host}:{args.port}/oauth2")
+    print(f"  TWITCH_API_URL=http://{args.host}:{args.port}/helix")
+    make_server(args.host, args.port, helix.create_app(), threaded=True).serve_forever()
+
+if __name__ == '__main__':
+    main()
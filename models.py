@@ -1,23 +1,97 @@
+import calendar
+import gzip
+import json
+import math
+import queue
+import re
 import sqlite3
+import time
+import threading
 from datetime import datetime, timedelta
 from config import Config
+from telemetry import instrument_queries
+
+# Converts a bound timestamp string in either stored format to epoch seconds
+EPOCH_SQL = "CAST(strftime('%s', ?) AS INTEGER)"
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None if it has no words"""
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
 
 class Database:
-    """Database manager for VODForge"""
+    """Database manager for VODForge
+    
+    Nothing touches the database file until the first connection is
+    requested, and the schema is created and migrated once per file per
+    process however many Database objects share it.
+    """
+    
+    _ready_paths = set()  # database files whose schema is up to date in this process
+    _ready_lock = threading.Lock()
     
     def __init__(self, db_path=None):
         self.db_path = db_path or Config.DATABASE_PATH
-        self.init_db()
+        self._pool = queue.LifoQueue(maxsize=Config.DB_POOL_SIZE)
     
     def get_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
+        """Get a pooled database connection; hand it back with release()"""
+        if self.db_path not in Database._ready_paths:
+            with Database._ready_lock:
+                if self.db_path not in Database._ready_paths:
+                    self.init_db()
+                    Database._ready_paths.add(self.db_path)
+        return self._checkout()
+    
+    def _checkout(self):
+        """Take an idle connection from the pool or open a new one"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything uncommitted"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    def close_all(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+    
+    def _connect(self):
+        """Open a connection tuned for concurrent dashboard reads and worker writes"""
+        # Connections are pooled across Flask request threads and worker
+        # threads, but only ever used by one thread at a time
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=Config.DB_BUSY_TIMEOUT / 1000,
+            check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
+        
+        # WAL lets readers proceed while the poller is writing
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(Config.DB_BUSY_TIMEOUT)}')
+        conn.execute(f'PRAGMA cache_size={-int(Config.DB_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(Config.DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
         return conn
     
     def init_db(self):
         """Initialize database tables"""
-        conn = self.get_connection()
+        conn = self._checkout()
         cursor = conn.cursor()
         
         # Streamers table
@@ -49,8 +123,281 @@ class Database:
         ''')
         
         conn.commit()
-        conn.close()
+        
+        try:
+            self.migrate(conn)
+        finally:
+            self.release(conn)
+    
+    def migrate(self, conn):
+        """Apply pending schema migrations, tracked with PRAGMA user_version"""
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            # IMMEDIATE serializes the app and worker migrating at the same time
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version <= current:
+                    conn.rollback()
+                    continue
+                migration(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+def _add_streamer_high_water_mark(cursor):
+    """Track the newest VOD seen per streamer"""
+    columns = [row['name'] for row in cursor.execute('PRAGMA table_info(streamers)')]
+    if 'last_vod_created_at' not in columns:
+        cursor.execute('ALTER TABLE streamers ADD COLUMN last_vod_created_at TEXT')
+
+def _add_vod_indexes(cursor):
+    """Index the dashboard, per-streamer and retention access paths"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_ended_at ON vods (ended_at DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_streamer_ended_at ON vods (streamer_id, ended_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_status_ended_at ON vods (status, ended_at)')
+
+def _add_vod_change_tracking(cursor):
+    """Version every VOD change so API clients can sync deltas"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vod_sync (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            pruned_version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO vod_sync (id) VALUES (1)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vod_tombstones (
+            vod_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('ALTER TABLE vods ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_version ON vods (version)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vod_tombstones_version ON vod_tombstones (version)')
+    
+    # Every insert, content update and delete bumps the global version and
+    # stamps it on the row (or its tombstone)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_version_insert AFTER INSERT ON vods
+        BEGIN
+            UPDATE vod_sync SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            UPDATE vods SET version = (SELECT version FROM vod_sync) WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_version_update
+        AFTER UPDATE OF streamer_id, url, title, duration_seconds, created_at, ended_at, status ON vods
+        BEGIN
+            UPDATE vod_sync SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            UPDATE vods SET version = (SELECT version FROM vod_sync) WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_version_delete AFTER DELETE ON vods
+        BEGIN
+            UPDATE vod_sync SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT OR REPLACE INTO vod_tombstones (vod_id, version)
+            VALUES (OLD.id, (SELECT version FROM vod_sync));
+        END
+    ''')
+
+def _add_vod_epoch_timestamps(cursor):
+    """Store created_at/ended_at as integer epoch seconds for sorting and range scans"""
+    cursor.execute('ALTER TABLE vods ADD COLUMN created_at_ts INTEGER')
+    cursor.execute('ALTER TABLE vods ADD COLUMN ended_at_ts INTEGER')
+    # strftime understands both the worker's format and Twitch's ISO 8601
+    cursor.execute('''
+        UPDATE vods SET
+            created_at_ts = CAST(strftime('%s', created_at) AS INTEGER),
+            ended_at_ts = CAST(strftime('%s', ended_at) AS INTEGER)
+    ''')
+    
+    cursor.execute('DROP INDEX IF EXISTS idx_vods_ended_at')
+    cursor.execute('DROP INDEX IF EXISTS idx_vods_streamer_ended_at')
+    cursor.execute('DROP INDEX IF EXISTS idx_vods_status_ended_at')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_ended_at_ts ON vods (ended_at_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_streamer_ended_at_ts ON vods (streamer_id, ended_at_ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vods_status_ended_at_ts ON vods (status, ended_at_ts)')
+
+def _add_streamer_leases(cursor):
+    """Let several worker processes split the streamers between them"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            heartbeat_at INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('ALTER TABLE streamers ADD COLUMN lease_owner TEXT')
+    cursor.execute('ALTER TABLE streamers ADD COLUMN lease_expires_at INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_streamers_lease_owner ON streamers (lease_owner)')
+
+def _add_vod_search_index(cursor):
+    """Full-text index over VOD titles and streamer handles for /api/vods/search"""
+    # rowid is the VOD's id; underscores stay inside tokens so handles like
+    # foo_bar match as one word, and 2-3 character prefixes are pre-indexed
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS vods_fts USING fts5(
+            title,
+            streamer_handle,
+            tokenize = "unicode61 remove_diacritics 2 tokenchars '_'",
+            prefix = '2 3'
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO vods_fts (rowid, title, streamer_handle)
+        SELECT v.id, v.title, s.handle
+        FROM vods v
+        JOIN streamers s ON v.streamer_id = s.id
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_fts_insert AFTER INSERT ON vods
+        BEGIN
+            INSERT INTO vods_fts (rowid, title, streamer_handle)
+            VALUES (NEW.id, NEW.title, (SELECT handle FROM streamers WHERE id = NEW.streamer_id));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_fts_update AFTER UPDATE OF title, streamer_id ON vods
+        BEGIN
+            UPDATE vods_fts
+            SET title = NEW.title,
+                streamer_handle = (SELECT handle FROM streamers WHERE id = NEW.streamer_id)
+            WHERE rowid = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS vods_fts_delete AFTER DELETE ON vods
+        BEGIN
+            DELETE FROM vods_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS streamers_fts_update AFTER UPDATE OF handle ON streamers
+        BEGIN
+            UPDATE vods_fts SET streamer_handle = NEW.handle
+            WHERE rowid IN (SELECT id FROM vods WHERE streamer_id = NEW.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS streamers_fts_delete AFTER DELETE ON streamers
+        BEGIN
+            DELETE FROM vods_fts WHERE rowid IN (SELECT id FROM vods WHERE streamer_id = OLD.id);
+        END
+    ''')
+
+def _add_oauth_tokens(cursor):
+    """Share Twitch app access tokens between processes"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS oauth_tokens (
+            client_id TEXT PRIMARY KEY,
+            access_token TEXT,
+            expires_at INTEGER,
+            refreshing_until INTEGER
+        )
+    ''')
+
+def _add_streamer_stats(cursor):
+    """Keep per-streamer VOD counts and latest VOD time current as VODs change"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS streamer_stats (
+            streamer_id INTEGER PRIMARY KEY,
+            vod_count INTEGER NOT NULL DEFAULT 0,
+            new_count INTEGER NOT NULL DEFAULT 0,
+            in_progress_count INTEGER NOT NULL DEFAULT 0,
+            clipped_count INTEGER NOT NULL DEFAULT 0,
+            last_vod_ended_at_ts INTEGER
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO streamer_stats
+            (streamer_id, vod_count, new_count, in_progress_count, clipped_count, last_vod_ended_at_ts)
+        SELECT streamer_id, COUNT(*), SUM(status IS 'new'), SUM(status IS 'in_progress'),
+               SUM(status IS 'clipped'), MAX(ended_at_ts)
+        FROM vods
+        GROUP BY streamer_id
+    ''')
+    
+    def adjust(row, sign):
+        # Add or remove one VOD (NEW or OLD) from its streamer's row; the
+        # latest VOD time is re-read through idx_vods_streamer_ended_at_ts
+        return f'''
+            INSERT OR IGNORE INTO streamer_stats (streamer_id) VALUES ({row}.streamer_id);
+            UPDATE streamer_stats
+            SET vod_count = vod_count {sign} 1,
+                new_count = new_count {sign} ({row}.status IS 'new'),
+                in_progress_count = in_progress_count {sign} ({row}.status IS 'in_progress'),
+                clipped_count = clipped_count {sign} ({row}.status IS 'clipped'),
+                last_vod_ended_at_ts = (SELECT MAX(ended_at_ts) FROM vods WHERE streamer_id = {row}.streamer_id)
+            WHERE streamer_id = {row}.streamer_id;
+        '''
+    
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS vods_stats_insert AFTER INSERT ON vods
+        BEGIN
+            {adjust('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS vods_stats_update AFTER UPDATE OF streamer_id, status, ended_at_ts ON vods
+        BEGIN
+            {adjust('OLD', '-')}
+            {adjust('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS vods_stats_delete AFTER DELETE ON vods
+        BEGIN
+            {adjust('OLD', '-')}
+        END
+    ''')
+
+def _version_existing_vods(cursor):
+    """Give VODs stored before change tracking existed a version, so since=0 returns them"""
+    # base + id keeps the versions distinct and newer than any already assigned
+    cursor.execute('UPDATE vods SET version = (SELECT version FROM vod_sync) + id WHERE version = 0')
+    cursor.execute('''
+        UPDATE vod_sync
+        SET version = MAX(version, (SELECT COALESCE(MAX(version), 0) FROM vods)),
+            updated_at = CURRENT_TIMESTAMP
+    ''')
 
+def _delete_vods_with_streamer(cursor):
+    """Delete a streamer's VODs along with it, so listings and deltas see them go"""
+    # Going through the vods delete triggers writes tombstones, moves the
+    # change version and keeps the search index and streamer_stats in step
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS streamers_delete_vods AFTER DELETE ON streamers
+        BEGIN
+            DELETE FROM vods WHERE streamer_id = OLD.id;
+            DELETE FROM streamer_stats WHERE streamer_id = OLD.id;
+        END
+    ''')
+    # VODs of streamers deleted before now were left behind, hidden by the joins
+    cursor.execute('DELETE FROM vods WHERE streamer_id NOT IN (SELECT id FROM streamers)')
+    cursor.execute('DELETE FROM streamer_stats WHERE streamer_id NOT IN (SELECT id FROM streamers)')
+
+# Schema migrations in order; the database's user_version is the number applied.
+# Only ever append to this list.
+MIGRATIONS = [
+    _add_streamer_high_water_mark,
+    _add_vod_indexes,
+    _add_vod_change_tracking,
+    _add_vod_epoch_timestamps,
+    _add_streamer_leases,
+    _add_vod_search_index,
+    _add_oauth_tokens,
+    _add_streamer_stats,
+    _version_existing_vods,
+    _delete_vods_with_streamer,
+]
+
+@instrument_queries
 class StreamerModel:
     """Model for managing streamers"""
     
@@ -72,7 +419,60 @@ class StreamerModel:
         except sqlite3.IntegrityError:
             return None
         finally:
-            conn.close()
+            self.db.release(conn)
+    
+    def add_streamers(self, handles):
+        """Add many streamers in one transaction
+        
+        handles must already be deduplicated. Handles already on the roster
+        (compared case-insensitively) are skipped. Returns (added, existing):
+        the new streamer rows and the handles that were already present.
+        """
+        if not handles:
+            return [], []
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        try:
+            # The write lock keeps other inserts out until commit, so new rows are exactly those past last_id
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM streamers')
+            last_id = cursor.fetchone()[0]
+            cursor.execute('SELECT lower(handle) FROM streamers')
+            known = {row[0] for row in cursor.fetchall()}
+            
+            existing = [handle for handle in handles if handle.lower() in known]
+            cursor.executemany(
+                'INSERT INTO streamers (handle) VALUES (?)',
+                [(handle,) for handle in handles if handle.lower() not in known]
+            )
+            cursor.execute('SELECT * FROM streamers WHERE id > ? ORDER BY id', (last_id,))
+            added = cursor.fetchall()
+            conn.commit()
+            return added, existing
+        finally:
+            self.db.release(conn)
+    
+    def iter_streamers(self, batch_size=1000):
+        """Yield every streamer in the order they were added, batch_size rows at a time from the cursor"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute('SELECT * FROM streamers ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            self.db.release(conn)
+    
+    def count_streamers(self):
+        """Get the number of streamers"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM streamers')
+        count = cursor.fetchone()[0]
+        self.db.release(conn)
+        return count
     
     def get_all_streamers(self):
         """Get all streamers"""
@@ -80,7 +480,30 @@ class StreamerModel:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM streamers ORDER BY added_at DESC')
         streamers = cursor.fetchall()
-        conn.close()
+        self.db.release(conn)
+        return streamers
+    
+    def get_streamer_summaries(self):
+        """Get all streamers with their VOD counts and latest VOD time, in one query
+        
+        The counts come from streamer_stats, which triggers keep current, so
+        this costs the same however many VODs there are.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.*,
+                   COALESCE(st.vod_count, 0) AS vod_count,
+                   COALESCE(st.new_count, 0) AS new_count,
+                   COALESCE(st.in_progress_count, 0) AS in_progress_count,
+                   COALESCE(st.clipped_count, 0) AS clipped_count,
+                   st.last_vod_ended_at_ts
+            FROM streamers s
+            LEFT JOIN streamer_stats st ON st.streamer_id = s.id
+            ORDER BY s.added_at DESC
+        ''')
+        streamers = cursor.fetchall()
+        self.db.release(conn)
         return streamers
     
     def get_streamer_by_id(self, streamer_id):
@@ -89,7 +512,16 @@ class StreamerModel:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM streamers WHERE id = ?', (streamer_id,))
         streamer = cursor.fetchone()
-        conn.close()
+        self.db.release(conn)
+        return streamer
+    
+    def get_streamer_by_handle(self, handle):
+        """Get streamer by handle, ignoring case"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM streamers WHERE handle = ? COLLATE NOCASE', (handle,))
+        streamer = cursor.fetchone()
+        self.db.release(conn)
         return streamer
     
     def update_twitch_user_id(self, streamer_id, twitch_user_id):
@@ -101,27 +533,88 @@ class StreamerModel:
             (twitch_user_id, streamer_id)
         )
         conn.commit()
-        conn.close()
+        self.db.release(conn)
+    
+    def get_streamers_by_ids(self, streamer_ids, chunk_size=500):
+        """Get the streamers with the given IDs, querying chunk_size IDs at a time"""
+        streamer_ids = list(streamer_ids)
+        if not streamer_ids:
+            return []
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        streamers = []
+        for start in range(0, len(streamer_ids), chunk_size):
+            chunk = streamer_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT * FROM streamers WHERE id IN ({placeholders})', chunk)
+            streamers.extend(cursor.fetchall())
+        self.db.release(conn)
+        return streamers
     
-    def update_last_checked(self, streamer_id):
-        """Update last checked timestamp"""
+    def get_unresolved_streamers(self, streamer_ids, chunk_size=500):
+        """Get the streamers among the given IDs that have no Twitch user ID yet"""
+        streamer_ids = list(streamer_ids)
+        if not streamer_ids:
+            return []
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        streamers = []
+        for start in range(0, len(streamer_ids), chunk_size):
+            chunk = streamer_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT * FROM streamers WHERE twitch_user_id IS NULL AND id IN ({placeholders})',
+                chunk
+            )
+            streamers.extend(cursor.fetchall())
+        self.db.release(conn)
+        return streamers
+    
+    def update_twitch_user_ids(self, user_ids):
+        """Update Twitch user IDs for many streamers in one transaction
+        
+        user_ids is a mapping of streamer ID to Twitch user ID.
+        """
+        if not user_ids:
+            return
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE streamers SET twitch_user_id = ? WHERE id = ?',
+            [(twitch_user_id, streamer_id) for streamer_id, twitch_user_id in user_ids.items()]
+        )
+        conn.commit()
+        self.db.release(conn)
+    
+    def update_last_checked(self, streamer_id, last_vod_created_at=None):
+        """Update last checked timestamp and, if given, the newest VOD seen"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            'UPDATE streamers SET last_checked = ? WHERE id = ?',
-            (datetime.utcnow(), streamer_id)
+            '''UPDATE streamers
+               SET last_checked = ?,
+                   last_vod_created_at = COALESCE(?, last_vod_created_at)
+               WHERE id = ?''',
+            (datetime.utcnow(), last_vod_created_at, streamer_id)
         )
         conn.commit()
-        conn.close()
+        self.db.release(conn)
     
     def delete_streamer(self, streamer_id):
-        """Delete a streamer"""
+        """Delete a streamer and, through a trigger, its VODs; returns the deleted VOD IDs"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM streamers WHERE id = ?', (streamer_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT id FROM vods WHERE streamer_id = ?', (streamer_id,))
+            vod_ids = [row['id'] for row in cursor.fetchall()]
+            cursor.execute('DELETE FROM streamers WHERE id = ?', (streamer_id,))
+            conn.commit()
+            return vod_ids
+        finally:
+            self.db.release(conn)
 
+@instrument_queries
 class VODModel:
     """Model for managing VODs"""
     
@@ -134,10 +627,12 @@ class VODModel:
         cursor = conn.cursor()
         try:
             cursor.execute(
-                '''INSERT INTO vods 
-                   (streamer_id, twitch_vod_id, url, title, duration_seconds, created_at, ended_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                (streamer_id, twitch_vod_id, url, title, duration_seconds, created_at, ended_at)
+                f'''INSERT INTO vods 
+                   (streamer_id, twitch_vod_id, url, title, duration_seconds, created_at, ended_at,
+                    created_at_ts, ended_at_ts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, {EPOCH_SQL}, {EPOCH_SQL})''',
+                (streamer_id, twitch_vod_id, url, title, duration_seconds, created_at, ended_at,
+                 created_at, ended_at)
             )
             conn.commit()
             vod_id = cursor.lastrowid
@@ -145,20 +640,104 @@ class VODModel:
         except sqlite3.IntegrityError:
             return None
         finally:
-            conn.close()
+            self.db.release(conn)
+    
+    def add_vods(self, streamer_id, vods):
+        """Add a batch of VODs for a streamer in one transaction
+        
+        vods is a list of dicts with twitch_vod_id, url, title, duration_seconds,
+        created_at and ended_at keys. VODs already stored are skipped. Returns
+        a list of (vod_id, twitch_vod_id) tuples for the rows actually inserted.
+        """
+        if not vods:
+            return []
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        inserted = []
+        try:
+            for vod in vods:
+                cursor.execute(
+                    f'''INSERT INTO vods
+                       (streamer_id, twitch_vod_id, url, title, duration_seconds, created_at, ended_at,
+                        created_at_ts, ended_at_ts)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, {EPOCH_SQL}, {EPOCH_SQL})
+                       ON CONFLICT(twitch_vod_id) DO NOTHING''',
+                    (streamer_id, vod['twitch_vod_id'], vod['url'], vod['title'],
+                     vod['duration_seconds'], vod['created_at'], vod['ended_at'],
+                     vod['created_at'], vod['ended_at'])
+                )
+                if cursor.rowcount:
+                    inserted.append((cursor.lastrowid, vod['twitch_vod_id']))
+            conn.commit()
+            return inserted
+        finally:
+            self.db.release(conn)
+    
+    def update_vod_durations(self, vods):
+        """Update the duration and ended_at of stored VODs that are still growing
+        
+        vods is a list of dicts with twitch_vod_id, duration_seconds and
+        ended_at keys. Returns the number of VODs that changed.
+        """
+        if not vods:
+            return 0
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            f'''UPDATE vods
+                SET duration_seconds = ?, ended_at = ?, ended_at_ts = {EPOCH_SQL}
+                WHERE twitch_vod_id = ? AND duration_seconds IS NOT ?''',
+            [(vod['duration_seconds'], vod['ended_at'], vod['ended_at'], vod['twitch_vod_id'], vod['duration_seconds'])
+             for vod in vods]
+        )
+        updated = cursor.rowcount
+        conn.commit()
+        self.db.release(conn)
+        return updated
     
     def get_vods_by_streamer(self, streamer_id):
         """Get all VODs for a streamer"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            'SELECT * FROM vods WHERE streamer_id = ? ORDER BY ended_at DESC',
+            'SELECT * FROM vods WHERE streamer_id = ? ORDER BY ended_at_ts DESC',
             (streamer_id,)
         )
         vods = cursor.fetchall()
-        conn.close()
+        self.db.release(conn)
         return vods
     
+    def get_streamer_activity(self, streamer_ids, chunk_size=500):
+        """Summarize when each streamer's VODs were created and ended
+        
+        Returns a dict of streamer ID to a row with vod_count, first_created_ts,
+        last_created_ts and last_ended_ts. Streamers without VODs are omitted.
+        Streamers are queried chunk_size at a time.
+        """
+        streamer_ids = list(streamer_ids)
+        if not streamer_ids:
+            return {}
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        activity = {}
+        for start in range(0, len(streamer_ids), chunk_size):
+            chunk = streamer_ids[start:start + chunk_size]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(
+                f'''SELECT streamer_id,
+                          COUNT(*) AS vod_count,
+                          MIN(created_at_ts) AS first_created_ts,
+                          MAX(created_at_ts) AS last_created_ts,
+                          MAX(ended_at_ts) AS last_ended_ts
+                   FROM vods
+                   WHERE streamer_id IN ({placeholders})
+                   GROUP BY streamer_id''',
+                chunk
+            )
+            activity.update((row['streamer_id'], row) for row in cursor.fetchall())
+        self.db.release(conn)
+        return activity
+    
     def get_all_vods(self):
         """Get all VODs"""
         conn = self.db.get_connection()
@@ -167,14 +746,150 @@ class VODModel:
             '''SELECT v.*, s.handle as streamer_handle 
                FROM vods v 
                JOIN streamers s ON v.streamer_id = s.id 
-               ORDER BY v.ended_at DESC'''
+               ORDER BY v.ended_at_ts DESC'''
+        )
+        vods = cursor.fetchall()
+        self.db.release(conn)
+        return vods
+    
+    def get_vods_page(self, limit, before=None, streamer_handle=None, status=None,
+                      ended_after=None, ended_before=None):
+        """Get one page of VODs, newest first, using keyset pagination
+        
+        before is the (ended_at_ts, id) of the last row on the previous page.
+        ended_after/ended_before bound ended_at_ts (epoch seconds).
+        """
+        conditions = []
+        params = []
+        if before:
+            conditions.append('(v.ended_at_ts, v.id) < (?, ?)')
+            params.extend(before)
+        if streamer_handle:
+            conditions.append('s.handle = ? COLLATE NOCASE')
+            params.append(streamer_handle)
+        if status:
+            conditions.append('v.status = ?')
+            params.append(status)
+        if ended_after:
+            conditions.append('v.ended_at_ts >= ?')
+            params.append(ended_after)
+        if ended_before:
+            conditions.append('v.ended_at_ts < ?')
+            params.append(ended_before)
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f'''SELECT v.*, s.handle as streamer_handle
+                FROM vods v
+                JOIN streamers s ON v.streamer_id = s.id
+                {where}
+                ORDER BY v.ended_at_ts DESC, v.id DESC
+                LIMIT ?''',
+            params + [limit]
         )
         vods = cursor.fetchall()
-        conn.close()
+        self.db.release(conn)
         return vods
     
+    def search_vods(self, query, limit, offset=0, streamer_handle=None, status=None):
+        """Full-text search over VOD titles and streamer handles, best matches first
+        
+        Every word in query must match, either exactly or as the start of a
+        word. Returns [] if query has no searchable words.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        
+        conditions = ['vods_fts MATCH ?']
+        params = [match]
+        if streamer_handle:
+            conditions.append('s.handle = ? COLLATE NOCASE')
+            params.append(streamer_handle)
+        if status:
+            conditions.append('v.status = ?')
+            params.append(status)
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f'''SELECT v.*, s.handle as streamer_handle
+                FROM vods_fts
+                JOIN vods v ON v.id = vods_fts.rowid
+                JOIN streamers s ON v.streamer_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY vods_fts.rank, v.ended_at_ts DESC
+                LIMIT ? OFFSET ?''',
+            params + [limit, offset]
+        )
+        vods = cursor.fetchall()
+        self.db.release(conn)
+        return vods
+    
+    def get_version(self):
+        """Get the current change version and when it last changed"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT version, updated_at FROM vod_sync WHERE id = 1')
+        row = cursor.fetchone()
+        self.db.release(conn)
+        return row['version'], row['updated_at']
+    
+    def get_changes_since(self, version, limit):
+        """Get VODs inserted, updated or deleted after a change version
+        
+        Returns a dict with the changed 'vods' rows, 'deleted' VOD IDs, the
+        'version' the caller has caught up to, 'has_more' if the limit cut the
+        changes short, and 'reset' if tombstones newer than version have been
+        pruned and the caller must resync from scratch. A resync from version
+        0 never needs deletions, so it is never reset.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        # One read transaction, so all three reads see the same snapshot
+        cursor.execute('BEGIN')
+        cursor.execute('SELECT version, pruned_version FROM vod_sync WHERE id = 1')
+        sync = cursor.fetchone()
+        
+        cursor.execute(
+            '''SELECT v.*, s.handle as streamer_handle
+               FROM vods v
+               JOIN streamers s ON v.streamer_id = s.id
+               WHERE v.version > ?
+               ORDER BY v.version
+               LIMIT ?''',
+            (version, limit + 1)
+        )
+        vods = cursor.fetchall()
+        cursor.execute(
+            'SELECT vod_id, version FROM vod_tombstones WHERE version > ? ORDER BY version LIMIT ?',
+            (version, limit + 1)
+        )
+        tombstones = cursor.fetchall()
+        conn.commit()
+        self.db.release(conn)
+        
+        # Interleave both kinds of change by version and cut at the limit
+        changes = sorted(
+            [(vod['version'], vod, False) for vod in vods] +
+            [(tombstone['version'], tombstone['vod_id'], True) for tombstone in tombstones],
+            key=lambda change: change[0]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        
+        return {
+            'version': changes[-1][0] if has_more else sync['version'],
+            'vods': [vod for _, vod, deleted in changes if not deleted],
+            'deleted': [vod_id for _, vod_id, deleted in changes if deleted],
+            'has_more': has_more,
+            'reset': 0 < version < sync['pruned_version']
+        }
+    
     def update_status(self, vod_id, status):
-        """Update VOD status"""
+        """Update VOD status; returns False if there is no such VOD"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         cursor.execute(
@@ -182,7 +897,62 @@ class VODModel:
             (status, vod_id)
         )
         conn.commit()
-        conn.close()
+        self.db.release(conn)
+        return cursor.rowcount > 0
+    
+    def update_statuses(self, status, vod_ids=None, streamer_id=None, current_status=None, chunk_size=500):
+        """Set the status of many VODs in one transaction
+        
+        Updates the VODs in vod_ids, or every VOD of streamer_id, optionally
+        only those whose status is current_status. VODs already in the target
+        status are left alone. Returns the IDs of the VODs that changed.
+        """
+        conditions = ['status IS NOT ?']
+        params = [status]
+        if current_status is not None:
+            conditions.append('status = ?')
+            params.append(current_status)
+        if streamer_id is not None:
+            conditions.append('streamer_id = ?')
+            params.append(streamer_id)
+        
+        if vod_ids is None:
+            chunks = [[]]
+        else:
+            vod_ids = list(vod_ids)
+            chunks = [vod_ids[i:i + chunk_size] for i in range(0, len(vod_ids), chunk_size)]
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        changed = []
+        try:
+            for chunk in chunks:
+                where = ' AND '.join(conditions)
+                if vod_ids is not None:
+                    where += f" AND id IN ({', '.join('?' * len(chunk))})"
+                cursor.execute(
+                    f'UPDATE vods SET status = ? WHERE {where} RETURNING id',
+                    [status] + params + chunk
+                )
+                changed.extend(row['id'] for row in cursor.fetchall())
+            conn.commit()
+            return changed
+        finally:
+            self.db.release(conn)
+    
+    def get_status_counts(self):
+        """Get the number of VODs in each status, from the per-streamer totals"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(new_count), 0) AS new,
+                   COALESCE(SUM(in_progress_count), 0) AS in_progress,
+                   COALESCE(SUM(clipped_count), 0) AS clipped
+            FROM streamer_stats
+        ''')
+        counts = dict(cursor.fetchone())
+        self.db.release(conn)
+        return counts
     
     def vod_exists(self, twitch_vod_id):
         """Check if VOD already exists"""
@@ -190,30 +960,259 @@ class VODModel:
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM vods WHERE twitch_vod_id = ?', (twitch_vod_id,))
         result = cursor.fetchone()
-        conn.close()
+        self.db.release(conn)
         return result is not None
-
-    def delete_old_vods(self, days=7):
-        """Delete VODs older than specified days"""
+    
+    def iter_twitch_vod_ids(self, batch_size=10000):
+        """Yield the Twitch ID of every stored VOD, batch_size rows at a time from the cursor"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
+        try:
+            cursor = conn.execute('SELECT twitch_vod_id FROM vods')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row[0]
+        finally:
+            self.db.release(conn)
 
+    def delete_old_vods(self, days=7, batch_size=1000, pause=0.0, archive_path=None, on_batch=None):
+        """Delete VODs older than specified days
+        
+        Rows are deleted batch_size at a time, each batch in its own short
+        transaction with a pause in between, so a large backlog never holds
+        the write lock for long. With archive_path, deleted rows are first
+        appended to that gzip-compressed JSON-lines file. on_batch, if given,
+        is called with the IDs and Twitch VOD IDs deleted by each batch.
+        Returns the number of VODs deleted.
+        """
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         cutoff_str = cutoff_date.strftime('%Y-%m-%d %H:%M:%S')
-
+        cutoff_ts = calendar.timegm(cutoff_date.timetuple())
+        delete_count = 0
+        
+        while True:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            try:
+                if archive_path:
+                    # Archived rows keep the full VOD and its streamer's handle
+                    cursor.execute(
+                        '''SELECT v.*, s.handle as streamer_handle
+                           FROM vods v
+                           LEFT JOIN streamers s ON v.streamer_id = s.id
+                           WHERE v.ended_at_ts < ?
+                           ORDER BY v.ended_at_ts
+                           LIMIT ?''',
+                        (cutoff_ts, batch_size)
+                    )
+                else:
+                    cursor.execute(
+                        'SELECT id, twitch_vod_id FROM vods WHERE ended_at_ts < ? ORDER BY ended_at_ts LIMIT ?',
+                        (cutoff_ts, batch_size)
+                    )
+                batch = cursor.fetchall()
+                if not batch:
+                    break
+                
+                if archive_path:
+                    with gzip.open(archive_path, 'at', encoding='utf-8') as archive:
+                        for vod in batch:
+                            archive.write(json.dumps(dict(vod)) + '\n')
+                
+                vod_ids = [vod['id'] for vod in batch]
+                placeholders = ', '.join('?' * len(vod_ids))
+                cursor.execute(f'DELETE FROM vods WHERE id IN ({placeholders})', vod_ids)
+                conn.commit()
+            finally:
+                self.db.release(conn)
+            
+            delete_count += len(vod_ids)
+            if on_batch:
+                on_batch(vod_ids, [vod['twitch_vod_id'] for vod in batch])
+            if len(batch) < batch_size:
+                break
+            time.sleep(pause)
+        
+        # Tombstones only need to outlive the rows they replace
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
         cursor.execute(
-            '''SELECT v.id, v.title, s.handle 
-               FROM vods v 
-               JOIN streamers s ON v.streamer_id = s.id 
-               WHERE v.ended_at < ?''',
+            '''UPDATE vod_sync SET pruned_version = MAX(pruned_version, COALESCE(
+                   (SELECT MAX(version) FROM vod_tombstones WHERE deleted_at < ?), 0))''',
             (cutoff_str,)
         )
-        vods_to_delete = cursor.fetchall()
-
-        cursor.execute('DELETE FROM vods WHERE ended_at < ?', (cutoff_str,))
-        delete_count = cursor.rowcount
+        cursor.execute('DELETE FROM vod_tombstones WHERE deleted_at < ?', (cutoff_str,))
+        conn.commit()
+        self.db.release(conn)
+        
+        return delete_count
 
+@instrument_queries
+class LeaseModel:
+    """Model for splitting streamers between worker processes
+    
+    Each worker heartbeats into the workers table and holds time-limited
+    leases on an even share of the streamers. Leases of workers that stop
+    heartbeating expire and are picked up by the others.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def sync_leases(self, worker_id, ttl):
+        """Heartbeat, rebalance and renew this worker's leases
+        
+        Returns the IDs of the streamers this worker now owns.
+        """
+        now = int(time.time())
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        try:
+            # IMMEDIATE so two workers never claim the same streamers
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(
+                '''INSERT INTO workers (worker_id, heartbeat_at) VALUES (?, ?)
+                   ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at''',
+                (worker_id, now)
+            )
+            cursor.execute('DELETE FROM workers WHERE heartbeat_at < ?', (now - ttl,))
+            
+            cursor.execute('SELECT COUNT(*) FROM workers')
+            worker_count = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM streamers')
+            streamer_count = cursor.fetchone()[0]
+            share = math.ceil(streamer_count / worker_count)
+            
+            cursor.execute(
+                'UPDATE streamers SET lease_expires_at = ? WHERE lease_owner = ?',
+                (now + ttl, worker_id)
+            )
+            cursor.execute('SELECT id FROM streamers WHERE lease_owner = ? ORDER BY id', (worker_id,))
+            owned = [row['id'] for row in cursor.fetchall()]
+            
+            if len(owned) > share:
+                # Hand the excess back so a newly joined worker can take it
+                excess = owned[share:]
+                owned = owned[:share]
+                placeholders = ', '.join('?' * len(excess))
+                cursor.execute(
+                    f'UPDATE streamers SET lease_owner = NULL, lease_expires_at = NULL WHERE id IN ({placeholders})',
+                    excess
+                )
+            elif len(owned) < share:
+                cursor.execute(
+                    '''SELECT id FROM streamers
+                       WHERE lease_owner IS NULL OR lease_expires_at < ?
+                       ORDER BY id
+                       LIMIT ?''',
+                    (now, share - len(owned))
+                )
+                claimed = [row['id'] for row in cursor.fetchall()]
+                cursor.executemany(
+                    'UPDATE streamers SET lease_owner = ?, lease_expires_at = ? WHERE id = ?',
+                    [(worker_id, now + ttl, streamer_id) for streamer_id in claimed]
+                )
+                owned.extend(claimed)
+            
+            conn.commit()
+            return owned
+        finally:
+            self.db.release(conn)
+    
+    def is_leader(self, worker_id):
+        """Whether this worker should run the once-per-cluster jobs"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(worker_id) FROM workers')
+        leader = cursor.fetchone()[0]
+        self.db.release(conn)
+        return leader is None or leader == worker_id
+    
+    def release_leases(self, worker_id):
+        """Give up all of this worker's leases so others take over at once"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'UPDATE streamers SET lease_owner = NULL, lease_expires_at = NULL WHERE lease_owner = ?',
+            (worker_id,)
+        )
+        cursor.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
         conn.commit()
-        conn.close()
+        self.db.release(conn)
 
-        return delete_count, vods_to_delete
+@instrument_queries
+class TokenModel:
+    """Model for the Twitch app access tokens shared by every process
+    
+    A process that finds no usable token claims the refresh for a short
+    while, so only one of them calls the token endpoint and the rest pick
+    up its result.
+    """
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def get_token(self, client_id):
+        """Get (access_token, expires_at) if a token that hasn't expired is stored, else None"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT access_token, expires_at FROM oauth_tokens WHERE client_id = ? AND expires_at > ?',
+            (client_id, int(time.time()))
+        )
+        row = cursor.fetchone()
+        self.db.release(conn)
+        return (row['access_token'], row['expires_at']) if row and row['access_token'] else None
+    
+    def claim_refresh(self, client_id, ttl):
+        """Claim the right to fetch a new token for ttl seconds; False if another process holds it"""
+        now = int(time.time())
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO oauth_tokens (client_id) VALUES (?)', (client_id,))
+        cursor.execute(
+            '''UPDATE oauth_tokens SET refreshing_until = ?
+               WHERE client_id = ? AND (refreshing_until IS NULL OR refreshing_until <= ?)''',
+            (now + ttl, client_id, now)
+        )
+        conn.commit()
+        self.db.release(conn)
+        return cursor.rowcount > 0
+    
+    def save_token(self, client_id, access_token, expires_at):
+        """Store a new token and release the refresh claim"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''INSERT INTO oauth_tokens (client_id, access_token, expires_at, refreshing_until)
+               VALUES (?, ?, ?, NULL)
+               ON CONFLICT (client_id) DO UPDATE SET
+                   access_token = excluded.access_token,
+                   expires_at = excluded.expires_at,
+                   refreshing_until = NULL''',
+            (client_id, access_token, expires_at)
+        )
+        conn.commit()
+        self.db.release(conn)
+    
+    def release_refresh(self, client_id):
+        """Give up a refresh claim without storing a token, e.g. after the fetch failed"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE oauth_tokens SET refreshing_until = NULL WHERE client_id = ?', (client_id,))
+        conn.commit()
+        self.db.release(conn)
+    
+    def discard_token(self, client_id, access_token):
+        """Forget a token Twitch rejected, unless another process has already replaced it"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''UPDATE oauth_tokens SET access_token = NULL, expires_at = NULL
+               WHERE client_id = ? AND access_token = ?''',
+            (client_id, access_token)
+        )
+        conn.commit()
+        self.db.release(conn)
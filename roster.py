@@ -0,0 +1,169 @@
+import re
+import io
+import csv
+import sys
+import json
+import argparse
+
+FORMATS = ['csv', 'json', 'txt']
+HANDLE_PATTERN = re.compile(r'^[a-z0-9_]{1,25}$')  # Twitch login rules
+HANDLE_COLUMNS = ['handle', 'login', 'username', 'user_login', 'channel']
+EXPORT_FIELDS = ['handle', 'twitch_user_id', 'added_at', 'last_checked']
+
+def normalize_handle(value):
+    """Reduce a handle, @handle or channel URL to a lowercase Twitch login, or None if it isn't one"""
+    handle = str(value).strip().lower()
+    handle = re.sub(r'^(https?://)?(www\.|m\.)?twitch\.tv/', '', handle).split('/')[0].split('?')[0]
+    handle = handle.lstrip('@')
+    return handle if HANDLE_PATTERN.match(handle) else None
+
+def detect_format(text, content_type=None, filename=None):
+    """Guess the format of an uploaded roster from its type, name or contents"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('application/json', 'text/json'):
+        return 'json'
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in FORMATS:
+        return extension
+    
+    stripped = text.lstrip()
+    if stripped.startswith(('[', '{')):
+        return 'json'
+    first_line = stripped.split('\n', 1)[0]
+    return 'csv' if ',' in first_line or '\t' in first_line else 'txt'
+
+def _json_values(data):
+    if isinstance(data, dict):
+        data = data.get('handles', data.get('streamers', []))
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict):
+            item = next((item[column] for column in HANDLE_COLUMNS if item.get(column)), '')
+        yield item
+
+def _csv_values(text):
+    dialect = csv.excel_tab if '\t' in text.split('\n', 1)[0] else csv.excel
+    rows = [row for row in csv.reader(io.StringIO(text), dialect) if row]
+    if not rows:
+        return
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in HANDLE_COLUMNS if name in header), None)
+    if column is None:
+        column = 0
+    else:
+        rows = rows[1:]
+    for row in rows:
+        if column < len(row):
+            yield row[column]
+
+def parse_handles(text, format=None):
+    """Parse a roster in CSV, JSON or one-per-line form
+    
+    Returns (handles, invalid): normalized handles in their original order
+    with duplicates removed, and the entries that aren't valid Twitch logins.
+    Raises ValueError if the text isn't valid JSON when JSON is expected.
+    """
+    format = format or detect_format(text)
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format: {format}')
+    
+    if format == 'json':
+        try:
+            values = _json_values(json.loads(text))
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e}')
+    elif format == 'csv':
+        values = _csv_values(text)
+    else:
+        values = (line for line in text.splitlines() if not line.strip().startswith('#'))
+    
+    handles = []
+    invalid = []
+    seen = set()
+    for value in values:
+        if not str(value).strip():
+            continue
+        handle = normalize_handle(value)
+        if handle is None:
+            invalid.append(str(value).strip())
+        elif handle not in seen:
+            seen.add(handle)
+            handles.append(handle)
+    return handles, invalid
+
+def export_roster(streamers, format='csv'):
+    """Yield a roster export chunk by chunk, so it never has to be held in memory"""
+    if format == 'json':
+        yield '['
+        for i, streamer in enumerate(streamers):
+            record = {field: streamer[field] for field in EXPORT_FIELDS}
+            yield (',\n' if i else '\n') + json.dumps(record)
+        yield '\n]\n'
+    elif format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for streamer in streamers:
+            writer.writerow([streamer[field] or '' for field in EXPORT_FIELDS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for streamer in streamers:
+            yield streamer['handle'] + '\n'
+
+def import_roster(streamer_model, text, format=None):
+    """Parse and add a roster; returns (added, existing, invalid)"""
+    handles, invalid = parse_handles(text, format)
+    added, existing = streamer_model.add_streamers(handles)
+    return added, existing, invalid
+
+def main():
+    """Bulk import or export streamers: python -m roster"""
+    parser = argparse.ArgumentParser(description='Bulk import or export the streamer roster')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    import_parser = subparsers.add_parser('import', help='Add the handles in a CSV, JSON or one-per-line file')
+    import_parser.add_argument('file', help="Roster file, or '-' for stdin")
+    import_parser.add_argument('--format', choices=FORMATS, help='Default: guess from the file name or contents')
+    import_parser.add_argument('--resolve', action='store_true', help='Look up Twitch user IDs for the new streamers now')
+    
+    export_parser = subparsers.add_parser('export', help='Write the roster to stdout')
+    export_parser.add_argument('--format', choices=FORMATS, default='csv')
+    args = parser.parse_args()
+    
+    from models import Database, StreamerModel
+    streamer_model = StreamerModel(Database())
+    
+    if args.command == 'export':
+        for chunk in export_roster(streamer_model.iter_streamers(), args.format):
+            sys.stdout.write(chunk)
+        return
+    
+    if args.file == '-':
+        text = sys.stdin.read()
+    else:
+        with open(args.file, encoding='utf-8-sig') as f:
+            text = f.read()
+    
+    try:
+        added, existing, invalid = import_roster(
+            streamer_model, text, args.format or detect_format(text, filename=args.file)
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    
+    print(f"Added {len(added)} streamer(s), {len(existing)} already present, {len(invalid)} invalid")
+    for value in invalid:
+        print(f"  Invalid handle: {value}")
+    
+    if args.resolve and added:
+        from worker import VODWorker
+        ready = VODWorker(db=streamer_model.db).resolve_user_ids(added)
+        print(f"Resolved Twitch user IDs for {len(ready)} of {len(added)} new streamer(s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import heapq
+import random
+from config import Config
+
+class PollScheduler:
+    """Priority queue of streamers ordered by when they are next due for a poll"""
+    
+    def __init__(self):
+        self._heap = []  # (due_at, streamer_id); entries superseded in _due are skipped
+        self._due = {}  # streamer_id -> due_at (epoch seconds)
+    
+    def __len__(self):
+        return len(self._due)
+    
+    def __contains__(self, streamer_id):
+        return streamer_id in self._due
+    
+    def streamer_ids(self):
+        """IDs of every scheduled streamer"""
+        return set(self._due)
+    
+    def schedule(self, streamer_id, due_at):
+        """Schedule (or reschedule) a streamer's next poll"""
+        self._due[streamer_id] = due_at
+        heapq.heappush(self._heap, (due_at, streamer_id))
+    
+    def remove(self, streamer_id):
+        """Stop scheduling a streamer"""
+        self._due.pop(streamer_id, None)
+    
+    def pop_due(self, now, limit=None):
+        """Remove and return the IDs of streamers due at or before now, at most limit of them"""
+        streamer_ids = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(streamer_ids) < limit):
+            due_at, streamer_id = heapq.heappop(self._heap)
+            if self._due.get(streamer_id) != due_at:
+                continue
+            del self._due[streamer_id]
+            streamer_ids.append(streamer_id)
+        return streamer_ids
+    
+    def next_due_at(self):
+        """When the next streamer is due, or None if nothing is scheduled"""
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+def poll_interval(activity, now):
+    """Seconds until a streamer should next be polled
+    
+    activity is the streamer's row from VODModel.get_streamer_activity, or
+    None if it has no VODs on record. Channels that streamed recently or are
+    due to stream again are polled at POLL_MIN_INTERVAL; the rest back off
+    towards POLL_MAX_INTERVAL the further they are from their next expected
+    VOD, whether it is still ahead or they are overdue and may have stopped.
+    """
+    if not activity or activity['last_ended_ts'] is None:
+        return Config.POLL_MAX_INTERVAL
+    
+    # Still live or just finished: another archive may appear any moment
+    if now - activity['last_ended_ts'] < Config.POLL_ACTIVE_WINDOW:
+        return Config.POLL_MIN_INTERVAL
+    
+    if activity['vod_count'] < 2:
+        return _clamp_interval(Config.POLL_INTERVAL)
+    
+    cadence = (activity['last_created_ts'] - activity['first_created_ts']) / (activity['vod_count'] - 1)
+    until_expected = activity['last_created_ts'] + cadence - now
+    
+    # Check at half the time from the expected stream, so polling tightens
+    # as it nears and relaxes again the longer an overdue channel stays quiet
+    return _clamp_interval(abs(until_expected) / 2)
+
+def _clamp_interval(interval):
+    """Keep an interval within the configured bounds"""
+    return max(Config.POLL_MIN_INTERVAL, min(Config.POLL_MAX_INTERVAL, interval))
+
+def jitter(interval):
+    """Spread an interval by +/- POLL_JITTER so polls don't bunch together"""
+    return interval * random.uniform(1 - Config.POLL_JITTER, 1 + Config.POLL_JITTER)
@@ -0,0 +1,244 @@
+import json
+import time
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import Config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """A named family of time series, one per combination of label values"""
+    
+    TYPE = None
+    
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # tuple of label values -> series state
+        self._lock = threading.Lock()
+        if not self.labelnames and self.TYPE != 'histogram':
+            self._series[()] = 0  # export unlabelled counters and gauges before their first update
+    
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def render(self):
+        """Prometheus text exposition lines for this metric"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.TYPE}']
+        with self._lock:
+            for key, state in sorted(self._series.items()):
+                lines.extend(self._render_series(key, state))
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    
+    TYPE = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    
+    TYPE = 'gauge'
+    
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+    
+    def _render_series(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+    
+    TYPE = 'histogram'
+    
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with block takes, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def _render_series(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+class MetricsRegistry:
+    """Every metric the process exposes, rendered together for /metrics"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+    
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+    
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+    
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+    
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# Shared by the web app and the worker running in the same process
+metrics = MetricsRegistry()
+
+DB_QUERY_DURATION = metrics.histogram(
+    'vodforge_db_query_duration_seconds',
+    'Time spent in each model method',
+    ['model', 'method']
+)
+
+def _timed_generator(method, labels):
+    """Wrap a generator function so the time spent producing its items is observed once it finishes
+    
+    Time the caller spends between items (writing a streamed response, say)
+    isn't counted.
+    """
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        generator = method(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            generator.close()
+            DB_QUERY_DURATION.observe(elapsed, **labels)
+    return timed
+
+def instrument_queries(cls):
+    """Class decorator timing every public method into DB_QUERY_DURATION
+    
+    Generator methods are timed across their whole iteration rather than the
+    call that creates them.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not callable(method):
+            continue
+        labels = {'model': cls.__name__, 'method': name}
+        
+        if inspect.isgeneratorfunction(method):
+            setattr(cls, name, _timed_generator(method, labels))
+            continue
+        
+        def wrap(method, labels=labels):
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                with DB_QUERY_DURATION.time(**labels):
+                    return method(*args, **kwargs)
+            return timed
+        
+        setattr(cls, name, wrap(method))
+    return cls
+
+def log(message, level='info', **fields):
+    """Print a log line, as JSON when LOG_FORMAT is json
+
+    fields are extra context (streamer handle, counts, durations) that only
+    appear as keys in JSON output; text output stays human-readable.
+    """
+    now = datetime.utcnow()
+    if Config.LOG_FORMAT == 'json':
+        record = {'time': now.strftime('%Y-%m-%dT%H:%M:%S.%fZ'), 'level': level, 'message': message.strip()}
+        record.update(fields)
+        print(json.dumps(record, default=str), flush=True)
+    else:
+        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would drown out the worker's own output
+
+def serve_metrics(port, host='0.0.0.0'):
+    """Serve /metrics from a background thread, for workers running without the web app"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,37 +1,325 @@
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from config import Config
+from telemetry import metrics
+
+TWITCH_REQUEST_DURATION = metrics.histogram(
+    'vodforge_twitch_request_duration_seconds',
+    'Twitch API request latency, per attempt',
+    ['endpoint', 'status']
+)
+TWITCH_RATE_LIMIT_REMAINING = metrics.gauge(
+    'vodforge_twitch_rate_limit_remaining',
+    'Helix request tokens left in the rate-limit bucket after the last request'
+)
+TWITCH_RATE_LIMIT_LIMIT = metrics.gauge('vodforge_twitch_rate_limit_limit', 'Helix requests allowed per minute')
+
+class TwitchAPIError(Exception):
+    """Raised when a Twitch API request fails after retries"""
+    
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class TwitchTimeoutError(TwitchAPIError):
+    """Raised when a request can't finish before its caller's deadline"""
+
+class RateLimiter:
+    """Token bucket that paces every Helix request made by a TwitchClient
+    
+    The bucket refills continuously at limit/60 tokens per second, matching
+    Helix's per-minute budget, and is corrected from the Ratelimit-* headers
+    of each response. Callers block in acquire() until a token is available
+    (or their deadline passes) instead of failing.
+    """
+    
+    WINDOW = 60  # seconds Helix takes to refill an empty bucket
+    THROTTLE_BURST = 20  # tokens' worth of refill to wait out after a 429 without Ratelimit-Reset
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.tokens = float(limit)
+        self.reset_at = None  # epoch seconds when Twitch reports a full bucket
+        self.blocked_until = 0.0  # epoch seconds; set after a 429
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition()
+    
+    def _refill(self):
+        """Add the tokens earned since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self._refilled_at) * self.limit / self.WINDOW)
+        self._refilled_at = now
+    
+    def acquire(self, deadline=None):
+        """Wait for and consume one request token
+        
+        deadline is a time.monotonic() value; returns False without taking a
+        token if none is available by then, otherwise True.
+        """
+        with self._cond:
+            while True:
+                self._refill()
+                wait = self.blocked_until - time.time()
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) * self.WINDOW / self.limit
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+    
+    def update(self, headers, throttled=False):
+        """Sync the bucket with the Ratelimit-* headers of a response"""
+        limit = headers.get('Ratelimit-Limit')
+        remaining = headers.get('Ratelimit-Remaining')
+        reset = headers.get('Ratelimit-Reset')
+        
+        with self._cond:
+            self._refill()
+            if limit:
+                self.limit = max(int(limit), 1)
+            if remaining is not None:
+                self.tokens = min(self.tokens, int(remaining))
+            if reset:
+                self.reset_at = int(reset)
+            if throttled:
+                self.tokens = 0
+                if reset:
+                    resume_at = self.reset_at
+                else:
+                    # An earlier response's reset time has usually passed already
+                    resume_at = time.time() + self.WINDOW / self.limit * self.THROTTLE_BURST
+                self.blocked_until = max(self.blocked_until, resume_at)
+            self._cond.notify_all()
+    
+    def status(self):
+        """Current budget as a dict"""
+        with self._cond:
+            self._refill()
+            return {
+                'limit': self.limit,
+                'remaining': int(self.tokens),
+                'reset_at': self.reset_at
+            }
 
 class TwitchClient:
     """Client for interacting with Twitch API"""
     
-    def __init__(self):
+    MAX_LOGINS_PER_REQUEST = 100  # Helix /users limit
+    MAX_USER_IDS_PER_REQUEST = 100  # Helix /streams limit
+    RETRY_STATUSES = (500, 502, 503, 504)
+    
+    TOKEN_EXPIRY_MARGIN = 300  # seconds before expiry that a token is treated as expired
+    TOKEN_REFRESH_WAIT = 0.25  # seconds between checks while another process refreshes the token
+    
+    def __init__(self, token_store=None):
+        """token_store is an optional models.TokenModel for sharing the app token between processes"""
         self.client_id = Config.TWITCH_CLIENT_ID
         self.client_secret = Config.TWITCH_CLIENT_SECRET
+        self.auth_url = Config.TWITCH_AUTH_URL
+        self.api_url = Config.TWITCH_API_URL
         self.access_token = None
         self.token_expires_at = None
+        self.timeout = Config.TWITCH_REQUEST_TIMEOUT
+        self.token_store = token_store
+        self._token_lock = threading.Lock()
+        self.session = self._create_session()
+        self.rate_limiter = RateLimiter(Config.TWITCH_RATE_LIMIT)
+        self._export_rate_limit()
+    
+    def _create_session(self):
+        """Create a pooled keep-alive session
+        
+        The adapter never retries by itself; _request does, so that every
+        attempt goes through the rate limiter.
+        """
+        adapter = HTTPAdapter(
+            pool_connections=Config.TWITCH_POOL_SIZE,
+            pool_maxsize=Config.TWITCH_POOL_SIZE,
+            max_retries=0
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        return session
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+    
+    def _request(self, method, url, authenticated=True, deadline=None, **kwargs):
+        """Send a request through the pooled session, retrying as needed, and return the response"""
+        token_refreshed = False
+        throttled_count = 0
+        retries = 0
+        
+        while True:
+            timeout = self.timeout
+            # A deadline (time.monotonic()) caps each attempt's timeout and the rate-limiter wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TwitchTimeoutError(f"{method} {url} ran past its deadline")
+                timeout = min(timeout, remaining)
+            
+            headers = None
+            if authenticated:
+                # Every attempt, retries included, takes its own rate-limit token
+                headers = self.get_headers()
+                if not self.rate_limiter.acquire(deadline):
+                    raise TwitchTimeoutError(f"{method} {url} timed out waiting for the rate limiter")
+            endpoint = url.rsplit('/', 1)[-1]
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                TWITCH_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint, status='error')
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TwitchTimeoutError(f"{method} {url} ran past its deadline: {e}") from e
+                # Connection failures are retried with exponential backoff, like 5xx responses
+                if isinstance(e, (requests.ConnectionError, requests.Timeout)) and retries < Config.TWITCH_MAX_RETRIES:
+                    retries += 1
+                    if not self._backoff(retries, deadline):
+                        raise TwitchTimeoutError(f"{method} {url} can't be retried before its deadline: {e}") from e
+                    continue
+                raise TwitchAPIError(f"{method} {url} failed: {e}") from e
+            TWITCH_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint, status=response.status_code)
+            
+            if authenticated:
+                self.rate_limiter.update(response.headers, throttled=response.status_code == 429)
+                self._export_rate_limit()
+            
+            # An expired token is refreshed and the request retried once
+            if response.status_code == 401 and authenticated and not token_refreshed:
+                token_refreshed = True
+                self.invalidate_token()
+                continue
+            # The limiter has been told about the 429, so this waits until the budget resets
+            if response.status_code == 429 and throttled_count < Config.TWITCH_RATE_LIMIT_RETRIES:
+                throttled_count += 1
+                continue
+            # 5xx responses are retried with exponential backoff, unless that would pass the deadline
+            if response.status_code in self.RETRY_STATUSES and retries < Config.TWITCH_MAX_RETRIES:
+                retries += 1
+                if not self._backoff(retries, deadline):
+                    raise TwitchTimeoutError(
+                        f"{method} {url} returned {response.status_code} and can't be retried before its deadline",
+                        status_code=response.status_code
+                    )
+                continue
+            if not response.ok:
+                raise TwitchAPIError(
+                    f"{method} {url} returned {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code
+                )
+            return response
+    
+    def _backoff(self, retries, deadline=None):
+        """Sleep before a retry, doubling the wait each time
+        
+        Returns False without sleeping if the wait would reach the deadline.
+        """
+        delay = Config.TWITCH_RETRY_BACKOFF * 2 ** (retries - 1)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+    
+    def get_rate_limit(self):
+        """Get the remaining Helix request budget"""
+        return self.rate_limiter.status()
+    
+    def _export_rate_limit(self):
+        """Publish the current budget to the rate-limit gauges"""
+        rate_limit = self.get_rate_limit()
+        TWITCH_RATE_LIMIT_REMAINING.set(rate_limit['remaining'])
+        TWITCH_RATE_LIMIT_LIMIT.set(rate_limit['limit'])
     
     def get_access_token(self):
         """Get OAuth access token from Twitch"""
         if self.access_token and self.token_expires_at and datetime.utcnow() < self.token_expires_at:
             return self.access_token
         
-        url = 'https://id.twitch.tv/oauth2/token'
+        # Only one polling thread refreshes the token; the rest reuse it
+        with self._token_lock:
+            if self.access_token and self.token_expires_at and datetime.utcnow() < self.token_expires_at:
+                return self.access_token
+            if self.token_store:
+                return self._get_shared_access_token()
+            return self._fetch_access_token()
+    
+    def _use_token(self, access_token, expires_at):
+        """Keep a token in memory until TOKEN_EXPIRY_MARGIN before it expires (expires_at is epoch seconds)"""
+        self.access_token = access_token
+        self.token_expires_at = datetime.utcfromtimestamp(expires_at - self.TOKEN_EXPIRY_MARGIN)
+        return access_token
+    
+    def _get_shared_access_token(self):
+        """Reuse the token stored by any process, fetching a new one only if none is usable
+        
+        If another process is already fetching, wait for its token rather than
+        requesting a second one; fetch anyway if it doesn't arrive in time.
+        """
+        stored = self.token_store.get_token(self.client_id)
+        if stored and stored[1] - self.TOKEN_EXPIRY_MARGIN > time.time():
+            return self._use_token(*stored)
+        
+        claim_ttl = self.timeout * (Config.TWITCH_MAX_RETRIES + 1)
+        if not self.token_store.claim_refresh(self.client_id, claim_ttl):
+            deadline = time.monotonic() + claim_ttl
+            while time.monotonic() < deadline:
+                time.sleep(self.TOKEN_REFRESH_WAIT)
+                stored = self.token_store.get_token(self.client_id)
+                if stored and stored[1] - self.TOKEN_EXPIRY_MARGIN > time.time():
+                    return self._use_token(*stored)
+        
+        try:
+            access_token, expires_at = self._request_access_token()
+        except Exception:
+            self.token_store.release_refresh(self.client_id)
+            raise
+        self.token_store.save_token(self.client_id, access_token, expires_at)
+        return self._use_token(access_token, expires_at)
+    
+    def _fetch_access_token(self):
+        """Request a new app access token and start using it"""
+        return self._use_token(*self._request_access_token())
+    
+    def _request_access_token(self):
+        """Request a new app access token; returns (access_token, expires_at in epoch seconds)"""
+        url = f'{self.auth_url}/token'
         params = {
             'client_id': self.client_id,
             'client_secret': self.client_secret,
             'grant_type': 'client_credentials'
         }
         
-        response = requests.post(url, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            self.access_token = data['access_token']
-            expires_in = data['expires_in']
-            self.token_expires_at = datetime.utcnow() + timedelta(seconds=expires_in - 300)
-            return self.access_token
-        else:
-            raise Exception(f"Failed to get access token: {response.text}")
+        try:
+            response = self._request('POST', url, authenticated=False, params=params)
+        except TwitchAPIError as e:
+            raise TwitchAPIError(f"Failed to get access token: {e}", status_code=e.status_code) from e
+        
+        data = response.json()
+        return data['access_token'], int(time.time()) + data['expires_in']
+    
+    def invalidate_token(self):
+        """Forget the current token so the next request fetches a new one"""
+        with self._token_lock:
+            if self.token_store and self.access_token:
+                self.token_store.discard_token(self.client_id, self.access_token)
+            self.access_token = None
+            self.token_expires_at = None
     
     def get_headers(self):
         """Get headers for API requests"""
@@ -43,32 +331,78 @@ class TwitchClient:
     
     def get_user_by_login(self, login):
         """Get user information by login name"""
-        url = 'https://api.twitch.tv/helix/users'
+        url = f'{self.api_url}/users'
         params = {'login': login}
-        headers = self.get_headers()
         
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            if data['data']:
-                return data['data'][0]
+        data = self._request('GET', url, params=params).json()
+        if data['data']:
+            return data['data'][0]
         return None
     
-    def get_videos(self, user_id, first=20):
+    def get_users_by_login(self, logins):
+        """Get user information for many login names, 100 per request
+        
+        A failed request doesn't lose the other chunks' results. Returns the
+        users found and a list of (logins, error) for each chunk that failed.
+        """
+        url = f'{self.api_url}/users'
+        users = []
+        failed = []
+        logins = list(logins)
+        
+        for start in range(0, len(logins), self.MAX_LOGINS_PER_REQUEST):
+            chunk = logins[start:start + self.MAX_LOGINS_PER_REQUEST]
+            params = [('login', login) for login in chunk]
+            try:
+                users.extend(self._request('GET', url, params=params).json()['data'])
+            except (TwitchAPIError, ValueError, KeyError) as e:
+                failed.append((chunk, e))
+        
+        return users, failed
+    
+    def get_live_streams(self, user_ids):
+        """Get the live streams of many users, 100 user IDs per request"""
+        url = f'{self.api_url}/streams'
+        streams = []
+        user_ids = list(user_ids)
+        
+        for start in range(0, len(user_ids), self.MAX_USER_IDS_PER_REQUEST):
+            chunk = user_ids[start:start + self.MAX_USER_IDS_PER_REQUEST]
+            params = [('user_id', user_id) for user_id in chunk] + [('first', self.MAX_USER_IDS_PER_REQUEST)]
+            streams.extend(self._request('GET', url, params=params).json()['data'])
+        
+        return streams
+    
+    def get_videos(self, user_id, first=20, after=None):
         """Get videos (VODs) for a user"""
-        url = 'https://api.twitch.tv/helix/videos'
+        videos, _ = self.get_video_page(user_id, first=first, after=after)
+        return videos
+    
+    def get_video_page(self, user_id, first=20, after=None, deadline=None):
+        """Get one page of a user's videos, newest first, plus the cursor for the next page"""
+        url = f'{self.api_url}/videos'
         params = {
             'user_id': user_id,
             'first': first,
             'type': 'archive'  # Only get VODs, not highlights or uploads
         }
-        headers = self.get_headers()
+        if after:
+            params['after'] = after
         
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            return data['data']
-        return []
+        data = self._request('GET', url, params=params, deadline=deadline).json()
+        return data['data'], data.get('pagination', {}).get('cursor')
+    
+    def iter_video_pages(self, user_id, first=20, max_pages=None, deadline=None):
+        """Yield pages of a user's videos, newest first, following the pagination cursor"""
+        cursor = None
+        pages = 0
+        while True:
+            videos, cursor = self.get_video_page(user_id, first=first, after=cursor, deadline=deadline)
+            pages += 1
+            if videos:
+                yield videos
+            if not cursor or not videos or (max_pages and pages >= max_pages):
+                return
     
     def parse_duration(self, duration_str):
         """Parse ISO 8601 duration string (e.g., '2h30m15s') to seconds"""
@@ -1,20 +1,74 @@
+import os
 import time
+import uuid
+import random
+import signal
+import socket
+import argparse
+import calendar
 import threading
-from datetime import datetime
-from models import Database, StreamerModel, VODModel
-from twitch_client import TwitchClient
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from models import Database, StreamerModel, VODModel, LeaseModel, TokenModel
+from twitch_client import TwitchClient, TwitchTimeoutError
+from known_vods import KnownVODIndex
+from roster import normalize_handle
+from events import event_bus
+from scheduler import PollScheduler, poll_interval, jitter
+from telemetry import metrics, log, serve_metrics
 from config import Config
 
+POLL_DURATION = metrics.histogram(
+    'vodforge_poll_streamer_duration_seconds',
+    'Time to poll one streamer for new VODs',
+    ['outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+POLL_TIMEOUTS = metrics.counter('vodforge_poll_streamer_timeouts_total', 'Streamer polls abandoned after POLL_STREAMER_TIMEOUT')
+SWEEP_DURATION = metrics.histogram(
+    'vodforge_sweep_duration_seconds',
+    'Time to poll one batch of due streamers',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+)
+SWEEP_STREAMERS = metrics.gauge('vodforge_sweep_streamers', 'Streamers polled in the last sweep')
+LAST_SWEEP_DURATION = metrics.gauge('vodforge_last_sweep_duration_seconds', 'Duration of the last sweep')
+SWEEP_OVERRUNS = metrics.counter('vodforge_sweep_overruns_total', 'Sweeps that took longer than POLL_INTERVAL')
+POLL_INTERVAL = metrics.gauge('vodforge_poll_interval_seconds', 'Configured POLL_INTERVAL, for comparison with sweep duration')
+POLL_INTERVAL.set(Config.POLL_INTERVAL)
+VODS_ADDED = metrics.counter('vodforge_vods_added_total', 'New VODs stored by the worker')
+VODS_DELETED = metrics.counter('vodforge_vods_deleted_total', 'VODs removed by retention cleanup')
+KNOWN_VOD_LOOKUPS = metrics.counter(
+    'vodforge_known_vod_lookups_total',
+    'Fetched VODs checked against the in-memory index (hit: skipped, miss: sent to the database)',
+    ['result']
+)
+KNOWN_VOD_INDEX_SIZE = metrics.gauge('vodforge_known_vod_index_size', 'VODs in the in-memory known-VOD index')
+
 class VODWorker:
     """Background worker that polls Twitch API for new VODs"""
     
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, worker_id=None, db=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._owns_db = db is None  # close its connections on stop unless they're shared
+        self.db = db or Database()
         self.streamer_model = StreamerModel(self.db)
         self.vod_model = VODModel(self.db)
-        self.twitch_client = TwitchClient()
+        self.lease_model = LeaseModel(self.db)
+        self.twitch_client = TwitchClient(token_store=TokenModel(self.db))
         self.running = False
+        self._wake = threading.Event()  # set to cut the main loop's sleep short
         self.thread = None
+        self.cleanup_thread = None
+        self._unknown_users = {}  # lowercased handle -> monotonic time to retry lookup
+        self.scheduler = PollScheduler()
+        self._live = {}  # streamer ID -> live at the last live-status check
+        self._live_checked_at = None  # monotonic time of the last successful check
+        self._ended_streams = set()  # streamer IDs whose newest VOD needs its final duration
+        self.known_vods = KnownVODIndex()  # Twitch IDs of stored VODs, loaded on the first sweep
+        self._poll_executor = None  # created on the first concurrent sweep and reused
+        self._in_flight = set()  # streamer IDs with a poll running on the executor
+        self._in_flight_lock = threading.Lock()
+        self._next_refresh = 0  # monotonic time the leases are next renewed
     
     def start(self):
         """Start the background worker"""
@@ -22,105 +76,495 @@ class VODWorker:
             return
         
         self.running = True
+        self._wake.clear()
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
-        print("VOD Worker started")
+        log("VOD Worker started", worker_id=self.worker_id)
     
     def stop(self):
         """Stop the background worker"""
         self.running = False
+        self._wake.set()
         if self.thread:
             self.thread.join(timeout=5)
-        print("VOD Worker stopped")
+        if self._poll_executor:
+            self._poll_executor.shutdown(wait=False, cancel_futures=True)
+            self._poll_executor = None
+            with self._in_flight_lock:
+                self._in_flight.clear()
+        try:
+            self.lease_model.release_leases(self.worker_id)
+        except Exception as e:
+            log(f"Error releasing leases: {e}", level='error')
+        if self._owns_db:
+            self.db.close_all()
+        log("VOD Worker stopped", worker_id=self.worker_id)
+    
+    def run(self):
+        """Run the worker loop in the current thread until stopped"""
+        self.running = True
+        self._wake.clear()
+        log(f"VOD Worker {self.worker_id} started", worker_id=self.worker_id)
+        try:
+            self._run()
+        finally:
+            self.stop()
     
     def _run(self):
-        """Main worker loop"""
+        """Main worker loop
+        
+        Streamers are polled as they come due on the adaptive schedule. Every
+        LEASE_RENEW_INTERVAL the worker renews its leases and syncs the schedule
+        with the streamers it owns; every CLEANUP_INTERVAL the cluster leader
+        starts a retention cleanup in its own thread so polling carries on.
+        Between rounds the loop sleeps until the next of these is due, but at
+        least a second.
+        """
+        next_cleanup = 0
+        next_live_check = 0
         while self.running:
             try:
-                self.poll_streamers()
-                self.cleanup_old_vods()
+                self._refresh_if_due()
+                
+                if time.monotonic() >= next_cleanup:
+                    if self.lease_model.is_leader(self.worker_id):
+                        self.start_cleanup()
+                    next_cleanup = time.monotonic() + Config.CLEANUP_INTERVAL
+                
+                if Config.LIVE_GATING and time.monotonic() >= next_live_check:
+                    self.check_live_status()
+                    next_live_check = time.monotonic() + Config.LIVE_CHECK_INTERVAL
+                
+                self.poll_due_streamers()
             except Exception as e:
-                print(f"Error in worker: {e}")
+                log(f"Error in worker: {e}", level='error')
             
-            # Sleep for the configured interval
-            for _ in range(Config.POLL_INTERVAL):
-                if not self.running:
-                    break
-                time.sleep(1)
+            wake_at = min(self._next_refresh, next_cleanup)
+            if Config.LIVE_GATING:
+                wake_at = min(wake_at, next_live_check)
+            sleep = wake_at - time.monotonic()
+            next_due = self.scheduler.next_due_at()
+            if next_due is not None:
+                sleep = min(sleep, next_due - time.time())
+            self._wake.wait(max(sleep, 1))
+    
+    def _refresh_if_due(self):
+        """Run refresh_schedule if LEASE_RENEW_INTERVAL has passed since the last one"""
+        if time.monotonic() >= self._next_refresh:
+            self.refresh_schedule()
+            self._next_refresh = time.monotonic() + Config.LEASE_RENEW_INTERVAL
     
-    def poll_streamers(self):
-        """Poll all streamers for new VODs"""
-        streamers = self.streamer_model.get_all_streamers()
+    def refresh_schedule(self):
+        """Renew this worker's streamer leases and sync the schedule with them
+        
+        Streamers it owns that have no Twitch user ID yet are resolved here,
+        all together, rather than a few at a time as they come due.
+        """
+        owned_ids = set(self.lease_model.sync_leases(self.worker_id, Config.LEASE_TTL))
+        unresolved = self.streamer_model.get_unresolved_streamers(owned_ids)
+        if unresolved:
+            self.resolve_user_ids(unresolved)
+        
+        for streamer_id in self.scheduler.streamer_ids() - owned_ids:
+            self.scheduler.remove(streamer_id)
+            self._live.pop(streamer_id, None)
+        
+        new_streamers = self.streamer_model.get_streamers_by_ids(owned_ids - self.scheduler.streamer_ids())
+        if not new_streamers:
+            return
         
+        activity = self.vod_model.get_streamer_activity(streamer['id'] for streamer in new_streamers)
+        now = time.time()
+        for streamer in new_streamers:
+            if streamer['last_checked']:
+                # Pick up where the last run left off instead of polling everyone at once
+                last_checked = datetime.fromisoformat(str(streamer['last_checked']))
+                interval = poll_interval(activity.get(streamer['id']), now)
+                due_at = calendar.timegm(last_checked.timetuple()) + jitter(interval)
+            else:
+                due_at = now + random.uniform(0, Config.POLL_MIN_INTERVAL)
+            self.scheduler.schedule(streamer['id'], due_at)
+    
+    def check_live_status(self):
+        """Look up who is live in batches and schedule an immediate poll for anyone who went live or offline"""
+        streamers = [
+            streamer for streamer in self.streamer_model.get_streamers_by_ids(self.scheduler.streamer_ids())
+            if streamer['twitch_user_id']
+        ]
         if not streamers:
             return
         
-        print(f"[{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}] Polling {len(streamers)} streamer(s) for VODs...")
+        try:
+            streams = self.twitch_client.get_live_streams(streamer['twitch_user_id'] for streamer in streamers)
+        except Exception as e:
+            log(f"Error checking live status: {e}", level='error')
+            return
         
+        live_user_ids = {stream['user_id'] for stream in streams}
+        now = time.time()
         for streamer in streamers:
-            try:
-                self.poll_streamer(streamer)
-            except Exception as e:
-                print(f"Error polling streamer {streamer['handle']}: {e}")
+            is_live = streamer['twitch_user_id'] in live_user_ids
+            was_live = self._live.get(streamer['id'])
+            self._live[streamer['id']] = is_live
+            if was_live is None or was_live == is_live:
+                continue
+            
+            if was_live:
+                self._ended_streams.add(streamer['id'])
+            self.scheduler.schedule(streamer['id'], now)
+        
+        self._live_checked_at = time.monotonic()
     
-    def poll_streamer(self, streamer):
-        """Poll a single streamer for new VODs"""
-        # Get Twitch user ID if we don't have it
-        if not streamer['twitch_user_id']:
-            user = self.twitch_client.get_user_by_login(streamer['handle'])
-            if user:
-                self.streamer_model.update_twitch_user_id(streamer['id'], user['id'])
-                streamer = dict(streamer)
-                streamer['twitch_user_id'] = user['id']
-            else:
-                print(f"Could not find Twitch user: {streamer['handle']}")
+    def _live_gating_active(self):
+        """Whether recent live-status checks can be trusted to trigger polls"""
+        return (
+            Config.LIVE_GATING
+            and self._live_checked_at is not None
+            and time.monotonic() - self._live_checked_at < 3 * Config.LIVE_CHECK_INTERVAL
+        )
+    
+    def poll_due_streamers(self):
+        """Poll the streamers whose turn has come, then schedule their next poll
+        
+        Due streamers are taken POLL_CONCURRENCY at a time, and leases are
+        renewed between chunks, so a long sweep never outlives LEASE_TTL.
+        """
+        now = time.time()
+        while self.running:
+            self._refresh_if_due()
+            due_ids = self.scheduler.pop_due(now, limit=max(Config.POLL_CONCURRENCY, 1))
+            if not due_ids:
                 return
+            self._poll_due_chunk(due_ids)
+    
+    def _poll_due_chunk(self, due_ids):
+        """Poll one chunk of due streamers and schedule their next poll"""
+        try:
+            self.poll_streamers(self.streamer_model.get_streamers_by_ids(due_ids))
+        finally:
+            activity = self.vod_model.get_streamer_activity(due_ids)
+            now = time.time()
+            gated = self._live_gating_active()
+            for streamer_id in due_ids:
+                interval = poll_interval(activity.get(streamer_id), now)
+                if gated:
+                    # Live-status changes trigger polls; this is only a safety recheck
+                    interval = max(interval, Config.LIVE_RECHECK_INTERVAL)
+                self.scheduler.schedule(streamer_id, now + jitter(interval))
+    
+    def poll_streamers(self, streamers=None):
+        """Poll streamers for new VODs (all of them by default)"""
+        if streamers is None:
+            streamers = self.streamer_model.get_all_streamers()
         
-        # Get videos from Twitch
-        videos = self.twitch_client.get_videos(streamer['twitch_user_id'])
+        if not streamers:
+            return
         
-        new_vod_count = 0
-        for video in videos:
-            # Check if we already have this VOD
-            if self.vod_model.vod_exists(video['id']):
+        streamers = self.resolve_user_ids(streamers)
+        if not streamers:
+            return
+        
+        if not self.known_vods.loaded:
+            self.load_known_vods()
+        
+        log(f"Polling {len(streamers)} streamer(s) for VODs...", streamers=len(streamers))
+        started = time.perf_counter()
+        
+        if Config.POLL_CONCURRENCY <= 1:
+            for streamer in streamers:
+                self._poll_and_log(streamer)
+        else:
+            self._poll_concurrently(streamers)
+        
+        duration = time.perf_counter() - started
+        SWEEP_DURATION.observe(duration)
+        SWEEP_STREAMERS.set(len(streamers))
+        LAST_SWEEP_DURATION.set(duration)
+        if duration > Config.POLL_INTERVAL:
+            SWEEP_OVERRUNS.inc()
+            log(f"Sweep of {len(streamers)} streamer(s) took {duration:.1f}s, longer than POLL_INTERVAL ({Config.POLL_INTERVAL}s)",
+                level='warning', streamers=len(streamers), duration=duration)
+    
+    def load_known_vods(self):
+        """Fill the known-VOD index from the database"""
+        started = time.perf_counter()
+        self.known_vods.load(self.vod_model.iter_twitch_vod_ids())
+        KNOWN_VOD_INDEX_SIZE.set(len(self.known_vods))
+        log(f"Loaded {len(self.known_vods)} known VOD ID(s) in {time.perf_counter() - started:.2f}s",
+            known_vods=len(self.known_vods))
+    
+    def resolve_user_ids(self, streamers):
+        """Resolve missing Twitch user IDs in bulk and return the streamers ready to poll
+        
+        refresh_schedule resolves every owned streamer up front; polls call
+        this too in case a lookup failed there or a streamer arrived since.
+        """
+        now = time.monotonic()
+        logins = {}  # streamer ID -> Twitch login
+        for streamer in streamers:
+            if streamer['twitch_user_id'] or self._unknown_users.get(streamer['handle'].lower(), 0) > now:
                 continue
+            login = normalize_handle(streamer['handle'])
+            if login is None:
+                self._unknown_users[streamer['handle'].lower()] = now + Config.UNKNOWN_USER_RETRY
+                log(f"Not a valid Twitch login: {streamer['handle']}", level='warning', streamer=streamer['handle'])
+                continue
+            logins[streamer['id']] = login
+        
+        resolved = {}
+        if logins:
+            users, failed = self.twitch_client.get_users_by_login(sorted(set(logins.values())))
+            failed_logins = set()
+            for chunk, error in failed:
+                failed_logins.update(chunk)
+                log(f"Error resolving {len(chunk)} Twitch user(s): {error}", level='error', logins=len(chunk))
             
-            # Calculate ended_at from created_at + duration
-            ended_at, duration_seconds = self.twitch_client.calculate_ended_at(
-                video['created_at'],
-                video['duration']
-            )
-            
-            # Add the VOD to database
-            vod_id = self.vod_model.add_vod(
-                streamer_id=streamer['id'],
-                twitch_vod_id=video['id'],
-                url=video['url'],
-                title=video['title'],
-                duration_seconds=duration_seconds,
-                created_at=video['created_at'],
-                ended_at=ended_at.strftime('%Y-%m-%d %H:%M:%S')
-            )
-            
-            if vod_id:
-                new_vod_count += 1
-                print(f"  → New VOD found: {streamer['handle']} - {video['title'][:50]}...")
+            user_ids = {user['login'].lower(): user['id'] for user in users}
+            for streamer in streamers:
+                login = logins.get(streamer['id'])
+                if login is None:
+                    continue
+                handle = streamer['handle'].lower()
+                if login in user_ids:
+                    resolved[streamer['id']] = user_ids[login]
+                    self._unknown_users.pop(handle, None)
+                elif login in failed_logins:
+                    # Only this chunk's handles wait; the rest resolved normally
+                    self._unknown_users[handle] = now + Config.USER_LOOKUP_RETRY
+                else:
+                    self._unknown_users[handle] = now + Config.UNKNOWN_USER_RETRY
+                    log(f"Could not find Twitch user: {streamer['handle']}", level='warning', streamer=streamer['handle'])
+            self.streamer_model.update_twitch_user_ids(resolved)
+        
+        ready = []
+        for streamer in streamers:
+            if streamer['twitch_user_id']:
+                ready.append(streamer)
+            elif streamer['id'] in resolved:
+                streamer = dict(streamer)
+                streamer['twitch_user_id'] = resolved[streamer['id']]
+                ready.append(streamer)
+        return ready
+    
+    def _poll_concurrently(self, streamers):
+        """Poll streamers on the worker's bounded thread pool, isolating failures per streamer
+        
+        Each poll enforces POLL_STREAMER_TIMEOUT itself, from when it starts
+        running, so streamers queued behind slow ones still get their full
+        time. Queued polls are never cancelled. If no poll finishes for longer
+        than a poll may take, the sweep stops waiting and leaves the rest to
+        finish on the pool; those streamers are skipped until they do.
+        """
+        if self._poll_executor is None:
+            self._poll_executor = ThreadPoolExecutor(max_workers=Config.POLL_CONCURRENCY, thread_name_prefix='vod-poll')
+        
+        pending = set()
+        for streamer in streamers:
+            with self._in_flight_lock:
+                if streamer['id'] in self._in_flight:
+                    continue
+                self._in_flight.add(streamer['id'])
+            pending.add(self._poll_executor.submit(self._poll_in_flight, streamer))
+        
+        # A poll's Twitch requests stop at its deadline, but a slow socket
+        # can outlast a capped timeout and the database work isn't covered,
+        # so allow one more TWITCH_REQUEST_TIMEOUT before calling it stalled
+        stall_timeout = Config.POLL_STREAMER_TIMEOUT + Config.TWITCH_REQUEST_TIMEOUT
+        while pending:
+            done, pending = wait(pending, timeout=stall_timeout)
+            if not done:
+                log(f"No streamer poll finished in {stall_timeout}s; leaving {len(pending)} to finish in the background",
+                    level='warning', pending=len(pending))
+                return
+    
+    def _poll_in_flight(self, streamer):
+        """Poll a streamer on the pool, marking it in flight until the poll ends"""
+        try:
+            self._poll_and_log(streamer)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(streamer['id'])
+    
+    def _poll_and_log(self, streamer):
+        """Poll a streamer, logging rather than raising failures so they can't affect other streamers"""
+        try:
+            self.poll_streamer(streamer)
+        except TwitchTimeoutError:
+            POLL_TIMEOUTS.inc()
+            log(f"Timed out polling streamer {streamer['handle']} after {Config.POLL_STREAMER_TIMEOUT}s",
+                level='error', streamer=streamer['handle'])
+        except Exception as e:
+            log(f"Error polling streamer {streamer['handle']}: {e}", level='error', streamer=streamer['handle'])
+    
+    def poll_streamer(self, streamer):
+        """Poll a single streamer for new VODs, recording how long it took
+        
+        Twitch requests give up with TwitchTimeoutError once the poll has run
+        for POLL_STREAMER_TIMEOUT seconds.
+        """
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            self._poll_streamer(streamer, deadline=time.monotonic() + Config.POLL_STREAMER_TIMEOUT)
+            outcome = 'ok'
+        except TwitchTimeoutError:
+            outcome = 'timeout'
+            raise
+        finally:
+            POLL_DURATION.observe(time.perf_counter() - started, outcome=outcome)
+    
+    def _poll_streamer(self, streamer, deadline=None):
+        """Poll a single streamer for new VODs; its Twitch user ID must already be resolved"""
+        # Once a stream ends its VOD has its final length, so look at the newest one again
+        stream_ended = streamer['id'] in self._ended_streams
+        videos = self.fetch_new_videos(streamer, include_high_water=stream_ended, deadline=deadline)
+        vods = [
+            {
+                'twitch_vod_id': video['id'],
+                'url': video['url'],
+                'title': video['title'],
+                'duration_seconds': duration_seconds,
+                'created_at': video['created_at'],
+                'ended_at': ended_at.strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for video, ended_at, duration_seconds in videos
+        ]
+        
+        # Only VODs this process hasn't stored go to the database; the rest
+        # need a write only when a finished stream changed their duration. A
+        # streamer's first poll skips the index, since a deleted and re-added
+        # streamer's VODs may still be listed there.
+        if streamer['last_vod_created_at'] is None:
+            known = []
+            unknown = vods
+        else:
+            known = [vod for vod in vods if vod['twitch_vod_id'] in self.known_vods]
+            unknown = [vod for vod in vods if vod['twitch_vod_id'] not in self.known_vods]
+        if known:
+            KNOWN_VOD_LOOKUPS.inc(len(known), result='hit')
+        if unknown:
+            KNOWN_VOD_LOOKUPS.inc(len(unknown), result='miss')
+        
+        # Add all new VODs to the database in one transaction
+        inserted = self.vod_model.add_vods(streamer['id'], unknown)
+        # Misses that weren't inserted were stored by another worker
+        self.known_vods.add(vod['twitch_vod_id'] for vod in unknown)
+        KNOWN_VOD_INDEX_SIZE.set(len(self.known_vods))
+        
+        if stream_ended:
+            inserted_ids = {twitch_vod_id for _, twitch_vod_id in inserted}
+            self.vod_model.update_vod_durations([vod for vod in vods if vod['twitch_vod_id'] not in inserted_ids])
+            self._ended_streams.discard(streamer['id'])
+        
+        videos_by_id = {video['id']: (video, ended_at, duration_seconds) for video, ended_at, duration_seconds in videos}
+        for vod_id, twitch_vod_id in inserted:
+            video, ended_at, duration_seconds = videos_by_id[twitch_vod_id]
+            log(f"  → New VOD found: {streamer['handle']} - {video['title'][:50]}...",
+                streamer=streamer['handle'], vod_id=vod_id, twitch_vod_id=twitch_vod_id)
+            event_bus.publish('vod_added', {
+                'id': vod_id,
+                'streamer_handle': streamer['handle'],
+                'title': video['title'],
+                'url': video['url'],
+                'duration_seconds': duration_seconds,
+                'ended_at': ended_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'status': 'new'
+            })
+        
+        if inserted:
+            VODS_ADDED.inc(len(inserted))
+            log(f"  Added {len(inserted)} new VOD(s) for {streamer['handle']}", streamer=streamer['handle'], added=len(inserted))
+        
+        # Update last checked timestamp and high-water mark
+        newest = max((video['created_at'] for video, _, _ in videos), default=None)
+        self.streamer_model.update_last_checked(streamer['id'], newest)
+    
+    def fetch_new_videos(self, streamer, include_high_water=False, deadline=None):
+        """Page through a streamer's videos, newest first, until reaching ones already seen
         
-        if new_vod_count > 0:
-            print(f"  Added {new_vod_count} new VOD(s) for {streamer['handle']}")
+        Returns (video, ended_at, duration_seconds) tuples for videos newer than
+        the streamer's high-water mark (or at it, with include_high_water) that
+        are still within the retention period.
+        """
+        high_water = streamer['last_vod_created_at']
+        cutoff = datetime.utcnow() - timedelta(days=Config.VOD_RETENTION_DAYS)
+        videos = []
         
-        # Update last checked timestamp
-        self.streamer_model.update_last_checked(streamer['id'])
+        pages = self.twitch_client.iter_video_pages(
+            streamer['twitch_user_id'],
+            first=Config.VIDEO_PAGE_SIZE,
+            max_pages=Config.VIDEO_MAX_PAGES,
+            deadline=deadline
+        )
+        for page in pages:
+            for video in page:
+                if high_water and (video['created_at'] < high_water or
+                                   (video['created_at'] == high_water and not include_high_water)):
+                    return videos
+                
+                # Calculate ended_at from created_at + duration
+                ended_at, duration_seconds = self.twitch_client.calculate_ended_at(
+                    video['created_at'],
+                    video['duration']
+                )
+                if ended_at < cutoff:
+                    return videos
+                
+                videos.append((video, ended_at, duration_seconds))
+        
+        return videos
 
+    def start_cleanup(self):
+        """Run cleanup_old_vods in the background unless a run is still going"""
+        if self.cleanup_thread and self.cleanup_thread.is_alive():
+            return
+        self.cleanup_thread = threading.Thread(target=self.cleanup_old_vods, daemon=True)
+        self.cleanup_thread.start()
+    
     def cleanup_old_vods(self):
-        """Delete VODs older than retention period"""
+        """Delete VODs older than retention period, one batch at a time"""
         try:
-            deleted_count, deleted_vods = self.vod_model.delete_old_vods(Config.VOD_RETENTION_DAYS)
+            deleted_count = self.vod_model.delete_old_vods(
+                Config.VOD_RETENTION_DAYS,
+                batch_size=Config.CLEANUP_BATCH_SIZE,
+                pause=Config.CLEANUP_BATCH_PAUSE,
+                archive_path=Config.VOD_ARCHIVE_PATH or None,
+                on_batch=self._on_vods_deleted
+            )
             
             if deleted_count > 0:
-                print(f"[{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}] Cleaned up {deleted_count} VOD(s) older than {Config.VOD_RETENTION_DAYS} days")
-                for vod in deleted_vods:
-                    print(f"  → Deleted: {vod['handle']} - {vod['title'][:50]}...")
+                VODS_DELETED.inc(deleted_count)
+                archived = f", archived to {Config.VOD_ARCHIVE_PATH}" if Config.VOD_ARCHIVE_PATH else ""
+                log(f"Cleaned up {deleted_count} VOD(s) older than {Config.VOD_RETENTION_DAYS} days{archived}", deleted=deleted_count)
         except Exception as e:
-            print(f"Error cleaning up old VODs: {e}")
+            log(f"Error cleaning up old VODs: {e}", level='error')
+
+    def _on_vods_deleted(self, vod_ids, twitch_vod_ids):
+        """Drop a cleanup batch from the known-VOD index and tell live clients"""
+        self.known_vods.discard(twitch_vod_ids)
+        KNOWN_VOD_INDEX_SIZE.set(len(self.known_vods))
+        event_bus.publish('vods_deleted', {'ids': vod_ids})
+
+def main():
+    """Run the worker as its own process: python -m worker"""
+    parser = argparse.ArgumentParser(description='Poll Twitch for new VODs')
+    parser.add_argument('--worker-id', help='Name for this worker in the lease table (default: host-pid-random)')
+    parser.add_argument('--metrics-port', type=int, default=Config.WORKER_METRICS_PORT,
+                        help='Serve Prometheus metrics on this port (default: WORKER_METRICS_PORT, 0 disables)')
+    args = parser.parse_args()
+    
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    
+    worker = VODWorker(worker_id=args.worker_id)
+    
+    def handle_signal(signum, frame):
+        worker.running = False
+        worker._wake.set()
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    worker.run()
 
+if __name__ == '__main__':
+    main()